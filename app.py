@@ -2,10 +2,11 @@ import streamlit as st
 import pandas as pd
 import hashlib
 from utils.auth import authenticate_user, register_user, is_admin
-from utils.data_handler import initialize_data_files
+from utils.startup import ensure_started
+from utils.memory_profiler import PROFILE_ENABLED, start_profiling, track_memory, check_budgets
 
-# Initialize data files
-initialize_data_files()
+# Initialize storage and start preloading once per server process; a no-op on later reruns
+ensure_started()
 
 # Set page configuration
 st.set_page_config(
@@ -122,8 +123,22 @@ def show_login_page():
                 else:
                     st.error("Please fill in all fields")
 
+def run_profiled():
+    """Run one rerun under tracemalloc and check it against the memory budgets"""
+    start_profiling()
+    usage = {}
+    with track_memory("app.rerun", usage):
+        main()
+    # Allocations a rerun does not release are attributed to the session that made them; memory a
+    # later rerun frees is credited back, so only the net total is clamped at zero
+    st.session_state.memory_retained = max(0, st.session_state.get('memory_retained', 0) + usage['retained'])
+    check_budgets(usage['peak'], st.session_state.memory_retained, st.session_state.username)
+
 if __name__ == "__main__":
-    main()
+    if PROFILE_ENABLED:
+        run_profiled()
+    else:
+        main()
 
 st.markdown("""
     <style>
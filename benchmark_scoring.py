@@ -0,0 +1,97 @@
+"""Throughput benchmark for scoring_server.py.
+
+Opens one keep-alive connection per client thread and sends batches of
+samples drawn from your_dataset.csv.
+
+Usage:
+    python scoring_server.py &
+    python benchmark_scoring.py --clients 4 --requests 500 --batch-size 32
+"""
+import argparse
+import csv
+import http.client
+import json
+import random
+import threading
+import time
+
+from utils.ml_model import FEATURE_COLUMNS
+
+
+def load_samples(path="your_dataset.csv"):
+    """Read parameter rows from the training CSV"""
+    samples = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                samples.append({col: float(row[col]) for col in FEATURE_COLUMNS})
+            except (KeyError, ValueError):
+                continue
+    return samples
+
+
+def run_client(host, port, bodies, latencies, errors):
+    """Send every body over a single persistent connection"""
+    conn = http.client.HTTPConnection(host, port)
+    for body in bodies:
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the water quality scoring server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client")
+    parser.add_argument("--batch-size", type=int, default=1, help="Samples per request")
+    args = parser.parse_args()
+
+    samples = load_samples()
+    rng = random.Random(42)
+
+    def make_body():
+        if args.batch_size == 1:
+            return json.dumps(rng.choice(samples))
+        return json.dumps([rng.choice(samples) for _ in range(args.batch_size)])
+
+    client_bodies = [[make_body() for _ in range(args.requests)] for _ in range(args.clients)]
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_client, args=(args.host, args.port, bodies, latencies, errors))
+        for bodies in client_bodies
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total_requests = args.clients * args.requests
+    print(f"Requests:      {total_requests} ({len(errors)} errors)")
+    print(f"Elapsed:       {elapsed:.2f}s")
+    print(f"Throughput:    {total_requests / elapsed:.1f} req/s, {total_requests * args.batch_size / elapsed:.1f} samples/s")
+    print(f"Latency p50:   {percentile(latencies, 50) * 1000:.2f} ms")
+    print(f"Latency p99:   {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
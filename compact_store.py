@@ -0,0 +1,44 @@
+"""Retention and compaction for the prediction store.
+
+Moves predictions older than the retention age out of data/predictions.csv
+into compressed, immutable segments under data/archive. Each segment is
+listed in data/archive/manifest.json with its date range, users and
+aggregates, so archived history stays available through
+get_user_predictions(..., include_archive=True) and the admin export while
+every regular reader only pays for the recent, hot rows.
+
+Usage:
+    python compact_store.py --max-age-days 90
+    python compact_store.py --max-age-days 30 --interval 86400
+"""
+import argparse
+import time
+from datetime import datetime
+
+from utils.data_handler import initialize_data_files, compact_predictions
+from utils.archive import get_archive_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old predictions out of the hot store")
+    parser.add_argument("--max-age-days", type=int, default=90, help="Keep predictions newer than this in the hot store")
+    parser.add_argument("--interval", type=int, default=0, help="Seconds between runs; 0 runs once and exits")
+    args = parser.parse_args()
+
+    initialize_data_files()
+    while True:
+        try:
+            archived = compact_predictions(args.max_age_days)
+            summary = get_archive_summary()
+            total = int(summary['rows'].sum()) if not summary.empty else 0
+            print(f"✅ [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Archived {archived} predictions "
+                  f"({total} archived in {len(summary)} segments)")
+        except Exception as e:
+            print(f"Compaction failed: {e}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
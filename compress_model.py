@@ -0,0 +1,163 @@
+"""Build smaller candidate models and report their accuracy/size/latency trade-off.
+
+Candidates are trained on the same split train_model.py uses: forests with
+fewer trees, forests with capped depth, forests whose leaves are merged by
+cost-complexity pruning, and single shallow trees distilled from the full
+forest. For each the report lists holdout accuracy, agreement with the full
+forest, pickle size, load time and single-sample and batch latency.
+Candidates are kept in models/candidates/ so one can be published without
+retraining; --select publishes it as the next model version, which is what
+load_model and get_cached_model then serve.
+
+Usage:
+    python compress_model.py
+    python compress_model.py --select forest_25_pruned
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.tree import DecisionTreeClassifier
+
+from utils.ml_model import FEATURE_COLUMNS, score_model
+from utils.training import split_base_dataset, load_registry, publish_model
+
+CANDIDATE_DIR = "models/candidates"
+REPORT_PATH = os.path.join(CANDIDATE_DIR, "report.json")
+
+
+def distill_tree(teacher, X_train, max_depth, samples=20000, seed=42):
+    """Fit a single tree to the teacher's predictions on the training rows plus jittered copies of them"""
+    rng = np.random.default_rng(seed)
+    base = X_train.sample(n=samples, replace=True, random_state=seed).to_numpy()
+    jittered = np.clip(base + rng.normal(0, 0.1, base.shape) * X_train.std().to_numpy(), 0, None)
+    X_distill = pd.concat([X_train, pd.DataFrame(jittered, columns=FEATURE_COLUMNS)], ignore_index=True)
+    student = DecisionTreeClassifier(max_depth=max_depth, random_state=seed)
+    student.fit(X_distill, teacher.predict(X_distill))
+    return student
+
+
+def build_candidates(X_train, y_train):
+    """Return {name: fitted model}; 'forest_100' matches train_model.py and is the reference"""
+    def forest(**params):
+        model = RandomForestClassifier(random_state=42, **params)
+        return model.fit(X_train, y_train)
+
+    reference = forest(n_estimators=100)
+    return {
+        'forest_100': reference,
+        'forest_50': forest(n_estimators=50),
+        'forest_25': forest(n_estimators=25),
+        'forest_10': forest(n_estimators=10),
+        'forest_50_depth8': forest(n_estimators=50, max_depth=8),
+        'forest_25_depth6': forest(n_estimators=25, max_depth=6),
+        'forest_25_pruned': forest(n_estimators=25, ccp_alpha=0.002),
+        'tree_distilled_depth6': distill_tree(reference, X_train, 6),
+        'tree_distilled_depth8': distill_tree(reference, X_train, 8),
+    }
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(model, reference_predictions, X_test, y_test, X_batch, repeat):
+    """Accuracy, size and latency figures for one candidate"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    payload = buffer.getvalue()
+    predictions, _ = score_model(model, X_test)
+    single = X_test.iloc[[0]]
+    trees = getattr(model, 'estimators_', [model])
+    return {
+        'accuracy': round(accuracy_score(y_test, predictions), 4),
+        'agreement': round(float((predictions == reference_predictions).mean()), 4),
+        'trees': len(trees),
+        'leaves': int(sum(tree.get_n_leaves() for tree in trees)),
+        'size_kb': round(len(payload) / 1024, 1),
+        'load_ms': round(best_time(lambda: joblib.load(io.BytesIO(payload)), repeat) * 1000, 2),
+        'single_ms': round(best_time(lambda: score_model(model, single), repeat * 5) * 1000, 3),
+        'batch_ms': round(best_time(lambda: score_model(model, X_batch), repeat) * 1000, 2),
+    }
+
+
+def print_report(report):
+    columns = ['accuracy', 'agreement', 'trees', 'leaves', 'size_kb', 'load_ms', 'single_ms', 'batch_ms']
+    print(pd.DataFrame.from_dict(report['candidates'], orient='index')[columns].to_string())
+    print(f"Batch latency is for {report['batch_rows']} rows.")
+    if report.get('recommended'):
+        print(f"Recommended: {report['recommended']} (smallest within {report['max_accuracy_drop']:.1%} "
+              f"of forest_100 accuracy)")
+
+
+def select_candidate(name):
+    """Publish a stored candidate as the next model version"""
+    path = os.path.join(CANDIDATE_DIR, f"{name}.pkl")
+    if not os.path.exists(path):
+        print(f"Error: no candidate named {name} in {CANDIDATE_DIR}; run compress_model.py first")
+        sys.exit(1)
+    try:
+        with open(REPORT_PATH) as f:
+            accuracy = json.load(f)['candidates'][name]['accuracy']
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        accuracy = None
+    registry = load_registry()
+    registry['accuracy'] = accuracy
+    registry = publish_model(joblib.load(path), registry)
+    print(f"✅ Published {name} as models/model.pkl (version {registry['version']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compressed candidate models")
+    parser.add_argument("--select", help="Publish a previously built candidate instead of building")
+    parser.add_argument("--batch-rows", type=int, default=10000, help="Rows in the batch latency test")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions; the best run is reported")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                        help="Accuracy a recommended candidate may give up against forest_100")
+    args = parser.parse_args()
+
+    if args.select:
+        select_candidate(args.select)
+        return
+
+    X_train, X_test, y_train, y_test = split_base_dataset()
+    X_batch = X_test.sample(n=args.batch_rows, replace=True, random_state=0)
+    candidates = build_candidates(X_train, y_train)
+    reference_predictions, _ = score_model(candidates['forest_100'], X_test)
+
+    os.makedirs(CANDIDATE_DIR, exist_ok=True)
+    results = {}
+    for name, model in candidates.items():
+        results[name] = measure(model, reference_predictions, X_test, y_test, X_batch, args.repeat)
+        joblib.dump(model, os.path.join(CANDIDATE_DIR, f"{name}.pkl"))
+
+    floor = results['forest_100']['accuracy'] - args.max_accuracy_drop
+    eligible = [name for name, result in results.items() if result['accuracy'] >= floor]
+    report = {
+        'batch_rows': args.batch_rows,
+        'max_accuracy_drop': args.max_accuracy_drop,
+        'recommended': min(eligible, key=lambda name: results[name]['size_kb']) if eligible else None,
+        'candidates': results,
+    }
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"✅ Candidates and report saved to {CANDIDATE_DIR}; publish one with --select NAME")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Offline water quality reports per state and region.
+
+Partitions the stored predictions by state/region (using the same normalized
+keys as the regional drift statistics) and renders one static HTML report
+per region with summary metrics, the dashboard charts and parameter
+violation tables; plotly.js is written once next to the reports so they
+open offline. Regions are rendered in a process pool. A manifest in the
+output directory records a fingerprint of each region's rows, so later runs
+only regenerate regions whose data changed.
+
+Usage:
+    python generate_reports.py
+    python generate_reports.py --output-dir reports --workers 4 --include-archive
+    python generate_reports.py --force
+"""
+import argparse
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from utils.data_handler import get_all_predictions
+from utils.ml_model import FEATURE_COLUMNS, SAFE_RANGES, format_confidence, get_parameter_violations
+from utils.region_stats import region_key, get_region_stats
+
+# Bump when the report layout changes so every region is rendered again
+REPORT_FORMAT_VERSION = 1
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #212529; }}
+table {{ border-collapse: collapse; margin: 1em 0; }}
+th, td {{ border: 1px solid #dee2e6; padding: 4px 10px; text-align: right; }}
+th {{ background: #f1f3f5; }}
+.metrics {{ display: flex; gap: 2em; }}
+.metric {{ background: #f8f9fa; padding: 1em; border-radius: 6px; }}
+.metric b {{ display: block; font-size: 1.6em; }}
+.flag {{ color: #c92a2a; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def report_filename(key):
+    """File name for a region key such as 'AP / Nellore'"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', key).strip('_').lower() + '.html'
+
+
+def partition_fingerprint(partition_df):
+    """Order-independent fingerprint of a region's rows"""
+    ids_hash = int(pd.util.hash_pandas_object(partition_df['prediction_id'].astype(str), index=False).sum())
+    latest = str(partition_df['timestamp'].astype(str).max())
+    return f"v{REPORT_FORMAT_VERSION}:{len(partition_df)}:{latest}:{ids_hash}"
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'regions': {}}
+
+
+def _save_manifest(manifest, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _write_html(path, title, body):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(PAGE_TEMPLATE.format(title=html.escape(title), body=body))
+    os.replace(tmp_path, path)
+
+
+def render_region_report(key, partition_df, drift_stats, output_path, generated_at):
+    """Render one region's report to output_path; runs in a worker process"""
+    # Imported here so only the workers pay for plotly
+    from utils.visualizations import (
+        create_potability_pie_chart,
+        create_parameter_violation_chart,
+        create_trends_over_time,
+    )
+
+    partition_df = partition_df.copy()
+    total = len(partition_df)
+    drinkable = int((partition_df['potability'] == 1).sum())
+    metrics = [
+        ("Samples", total),
+        ("Drinkable", f"{drinkable} ({drinkable / total:.0%})"),
+        ("Avg Confidence", f"{partition_df['confidence'].mean():.1f}%" if partition_df['confidence'].notna().any() else "N/A"),
+        ("Contributors", partition_df['user_id'].nunique()),
+        ("Period", f"{str(partition_df['timestamp'].min())[:10]} to {str(partition_df['timestamp'].max())[:10]}"),
+    ]
+
+    violations = get_parameter_violations(partition_df)
+    parameter_table = pd.DataFrame({
+        'Parameter': FEATURE_COLUMNS,
+        'Safe Range': [f"{SAFE_RANGES[p][0]} - {SAFE_RANGES[p][1]}" for p in FEATURE_COLUMNS],
+        'Mean': [round(partition_df[p].mean(), 2) for p in FEATURE_COLUMNS],
+        'Min': [round(partition_df[p].min(), 2) for p in FEATURE_COLUMNS],
+        'Max': [round(partition_df[p].max(), 2) for p in FEATURE_COLUMNS],
+        'Violations': [int(violations[p].sum()) for p in FEATURE_COLUMNS],
+        'Violation Rate': [f"{violations[p].mean():.0%}" for p in FEATURE_COLUMNS],
+    })
+
+    recent = partition_df.sort_values('timestamp', ascending=False).head(20)
+    recent_violations = violations.loc[recent.index]
+    recent_table = pd.DataFrame({
+        'Timestamp': recent['timestamp'],
+        'Result': recent['potability'].map({1: 'Drinkable', 0: 'Not Drinkable'}),
+        'Confidence': recent['confidence'].map(format_confidence),
+        'Unsafe Parameters': [', '.join(p for p in FEATURE_COLUMNS if row[p]) or '-' for _, row in recent_violations.iterrows()],
+    })
+
+    sections = [
+        f"<h1>Water Quality Report: {html.escape(key)}</h1>",
+        f"<p>Generated {generated_at}</p>",
+        '<div class="metrics">' + ''.join(
+            f'<div class="metric">{html.escape(label)}<b>{html.escape(str(value))}</b></div>' for label, value in metrics
+        ) + '</div>',
+    ]
+
+    if drift_stats and drift_stats.get('anomalies'):
+        sections.append(f'<p class="flag">⚠️ Latest drift check ({html.escape(str(drift_stats.get("last_anomaly_timestamp")))}): '
+                        f'{html.escape(", ".join(drift_stats["anomalies"]))}</p>')
+
+    for fig in (create_potability_pie_chart(partition_df),
+                create_trends_over_time(partition_df),
+                create_parameter_violation_chart(partition_df)):
+        sections.append(fig.to_html(full_html=False, include_plotlyjs=False))
+
+    sections.append("<h2>Parameter Summary</h2>")
+    sections.append(parameter_table.to_html(index=False, border=0))
+    sections.append("<h2>Most Recent Samples</h2>")
+    sections.append(recent_table.to_html(index=False, border=0))
+
+    _write_html(output_path, f"Water Quality Report: {key}", '\n'.join(sections))
+    return key
+
+
+def write_index(output_dir, manifest, generated_at):
+    """Write the index page linking every region report"""
+    rows = ''.join(
+        f"<tr><td style='text-align:left'><a href='{entry['file']}'>{html.escape(key)}</a></td>"
+        f"<td>{entry['rows']}</td><td>{entry['potability_rate']:.0%}</td><td>{entry['generated_at']}</td></tr>"
+        for key, entry in sorted(manifest['regions'].items())
+    )
+    body = (f"<h1>Water Quality Reports</h1><p>Updated {generated_at}</p>"
+            f"<table><tr><th>Region</th><th>Samples</th><th>Drinkable</th><th>Generated</th></tr>{rows}</table>")
+    _write_html(os.path.join(output_dir, 'index.html'), "Water Quality Reports", body)
+
+
+def generate_reports(output_dir="reports", workers=None, force=False, include_archive=False):
+    """Render reports for regions whose data changed since the last run; returns (rendered, skipped)"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = _load_manifest(manifest_path)
+
+    plotly_path = os.path.join(output_dir, 'plotly.min.js')
+    if not os.path.exists(plotly_path):
+        from plotly.offline import get_plotlyjs
+        with open(plotly_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    predictions_df = get_all_predictions(include_archive=include_archive)
+    if predictions_df.empty:
+        write_index(output_dir, manifest, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        return 0, 0
+
+    keys = [region_key(state, region) for state, region in
+            zip(predictions_df['state'].astype(object).fillna('unknown'), predictions_df['region'].astype(object).fillna('unknown'))]
+    partitions = dict(tuple(predictions_df.groupby(pd.Series(keys, index=predictions_df.index), sort=True)))
+
+    generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    drift = get_region_stats() or {}
+    pending = {}
+    for key, partition_df in partitions.items():
+        fingerprint = partition_fingerprint(partition_df)
+        entry = manifest['regions'].get(key)
+        filename = report_filename(key)
+        if (not force and entry and entry['fingerprint'] == fingerprint
+                and os.path.exists(os.path.join(output_dir, filename))):
+            continue
+        pending[key] = {
+            'fingerprint': fingerprint,
+            'file': filename,
+            'rows': int(len(partition_df)),
+            'potability_rate': float((partition_df['potability'] == 1).mean()),
+            'generated_at': generated_at,
+        }
+
+    rendered = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(render_region_report, key, partitions[key], drift.get(key),
+                                os.path.join(output_dir, entry['file']), generated_at): key
+                for key, entry in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error rendering report for {key}: {e}")
+                    continue
+                manifest['regions'][key] = pending[key]
+                rendered += 1
+        _save_manifest(manifest, manifest_path)
+
+    write_index(output_dir, manifest, generated_at)
+    return rendered, len(partitions) - len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate HTML water quality reports per state and region")
+    parser.add_argument("--output-dir", default="reports", help="Directory for the reports and manifest")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Regenerate every region, even if unchanged")
+    parser.add_argument("--include-archive", action="store_true", help="Include archived predictions")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered, skipped = generate_reports(args.output_dir, args.workers, args.force, args.include_archive)
+    print(f"✅ Rendered {rendered} region reports, {skipped} unchanged, in {time.perf_counter() - start:.1f}s "
+          f"({os.path.join(args.output_dir, 'index.html')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Continuous sensor-stream ingestion with windowed aggregation and alerts.
+
+Reads newline-delimited JSON readings, one per line, for example:
+
+    {"site_id": "nellore-01", "timestamp": "2025-08-01 10:00:00", "pH": 7.1, "Solids": 900, ...}
+
+from a file that is tailed like `tail -f`, or from a local TCP socket that
+stands in for a sensor gateway. Readings are scored in micro-batches with the
+trained model, each site keeps a sliding window of its latest readings in
+ring buffers, and an alert fires when a precaution rule (the same conditions
+as generate_precautions) holds for most readings across the window.
+
+Usage:
+    python ingest_stream.py --file readings.ndjson
+    python ingest_stream.py --socket 127.0.0.1:9099
+    python ingest_stream.py --benchmark 200000
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS, get_cached_model, score_batch, get_precaution_flags
+from utils.stream_window import SiteWindow, RULE_PARAMETERS, RULE_MESSAGES
+
+
+def tail_file(path, lines, from_start=False, poll_interval=0.2):
+    """Push complete lines appended to a file onto the queue, following truncation"""
+    with open(path, 'r') as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        partial = ''
+        while True:
+            line = f.readline()
+            if not line:
+                if os.path.getsize(path) < f.tell():
+                    f.seek(0)
+                    partial = ''
+                time.sleep(poll_interval)
+                continue
+            if not line.endswith('\n'):
+                partial += line
+                continue
+            lines.put(partial + line)
+            partial = ''
+
+
+def serve_socket(host, port, lines):
+    """Accept gateway connections and push every received line onto the queue"""
+    server = socket.create_server((host, port))
+
+    def handle(conn):
+        with conn, conn.makefile('r') as stream:
+            for line in stream:
+                lines.put(line)
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+class StreamProcessor:
+    """Scores micro-batches of readings and maintains per-site windows and alerts"""
+
+    def __init__(self, model, window_size=120, persist_fraction=0.8, min_readings=None, alerts_path=None):
+        self.model = model
+        self.window_size = window_size
+        self.persist_fraction = persist_fraction
+        self.min_readings = min_readings or window_size // 2
+        self.alerts_path = alerts_path
+        self.windows = {}
+        self.processed = 0
+        self.rejected = 0
+
+    def process_lines(self, raw_lines):
+        """Parse, score and aggregate a micro-batch of raw JSON lines"""
+        readings = []
+        for line in raw_lines:
+            try:
+                reading = json.loads(line)
+            except json.JSONDecodeError:
+                self.rejected += 1
+                continue
+            if isinstance(reading, dict) and all(col in reading for col in FEATURE_COLUMNS):
+                readings.append(reading)
+            else:
+                self.rejected += 1
+        if readings:
+            self.process_frame(pd.DataFrame(readings))
+
+    def process_frame(self, batch):
+        """Score a DataFrame of readings and fold it into the site windows"""
+        # Readings with a missing, non-numeric or non-finite parameter are rejected, not scored
+        batch = batch.copy()
+        batch[FEATURE_COLUMNS] = batch[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan)
+        valid = batch[FEATURE_COLUMNS].notna().all(axis=1)
+        self.rejected += int((~valid).sum())
+        batch = batch[valid]
+        if batch.empty:
+            return
+        if 'site_id' not in batch.columns:
+            batch['site_id'] = batch.get('region', pd.Series('unknown', index=batch.index)).fillna('unknown')
+
+        predictions, confidences = score_batch(self.model, batch)
+        flags = get_precaution_flags(batch)[RULE_PARAMETERS].to_numpy()
+        sites, site_index = np.unique(batch['site_id'].astype(str).to_numpy(), return_inverse=True)
+        timestamps = batch['timestamp'].astype(str).to_numpy() if 'timestamp' in batch.columns else None
+
+        # Group rows by site with a stable sort so each window sees readings in arrival order
+        order = np.argsort(site_index, kind='stable')
+        boundaries = np.searchsorted(site_index[order], np.arange(len(sites) + 1))
+        for i, site in enumerate(sites):
+            rows = order[boundaries[i]:boundaries[i + 1]]
+            window = self.windows.get(site)
+            if window is None:
+                window = self.windows[site] = SiteWindow(self.window_size)
+            window.push(predictions[rows], confidences[rows], flags[rows])
+            raised, cleared = window.update_alerts(self.persist_fraction, self.min_readings)
+            last_seen = timestamps[rows[-1]] if timestamps is not None else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for param in raised:
+                self.emit_alert(site, param, 'raised', window, last_seen)
+            for param in cleared:
+                self.emit_alert(site, param, 'cleared', window, last_seen)
+        self.processed += len(batch)
+
+    def emit_alert(self, site, param, state, window, timestamp):
+        rate = window.aggregates()['violation_rates'][param]
+        if state == 'raised':
+            print(f"🚨 [{timestamp}] {site}: {RULE_MESSAGES[param]} ({rate:.0%} of last {window.count} readings)")
+        else:
+            print(f"✅ [{timestamp}] {site}: {param} back within limits")
+        if self.alerts_path:
+            with open(self.alerts_path, 'a') as f:
+                f.write(json.dumps({
+                    'timestamp': timestamp, 'site_id': site, 'parameter': param,
+                    'state': state, 'violation_rate': round(rate, 3)
+                }) + '\n')
+
+    def site_summary(self):
+        """Return the current window aggregates for every site"""
+        return {site: window.aggregates() for site, window in self.windows.items()}
+
+
+def run_benchmark(processor, rows, batch_size):
+    """Replay synthetic readings drawn from the training data through the processor"""
+    base = pd.read_csv("your_dataset.csv").dropna()[FEATURE_COLUMNS]
+    rng = np.random.default_rng(0)
+    frame = base.sample(n=rows, replace=True, random_state=0).reset_index(drop=True)
+    frame['site_id'] = [f"site-{i}" for i in rng.integers(0, 50, size=rows)]
+    lines = [json.dumps(record) for record in frame.to_dict(orient='records')]
+
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        processor.process_lines(lines[offset:offset + batch_size])
+    elapsed = time.perf_counter() - start
+    print(f"Processed {processor.processed} readings in {elapsed:.2f}s "
+          f"({processor.processed / elapsed:,.0f} readings/s, batch size {batch_size})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a stream of water quality readings")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Newline-delimited JSON file to tail")
+    source.add_argument("--socket", help="HOST:PORT to accept newline-delimited JSON on")
+    source.add_argument("--benchmark", type=int, help="Score this many synthetic readings and report throughput")
+    parser.add_argument("--from-start", action="store_true", help="Read the file from the beginning")
+    parser.add_argument("--batch-size", type=int, default=500, help="Maximum readings per micro-batch")
+    parser.add_argument("--max-latency", type=float, default=0.5, help="Seconds before a partial batch is scored")
+    parser.add_argument("--window", type=int, default=120, help="Readings kept per site")
+    parser.add_argument("--persist-fraction", type=float, default=0.8,
+                        help="Share of the window that must violate a rule to raise an alert")
+    parser.add_argument("--alerts-file", default=None, help="Append alerts as JSON lines to this file")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="Seconds between throughput reports")
+    parser.add_argument("--model", default="models/model.pkl")
+    args = parser.parse_args()
+
+    processor = StreamProcessor(get_cached_model(args.model), args.window, args.persist_fraction,
+                                alerts_path=args.alerts_file)
+    if args.benchmark:
+        run_benchmark(processor, args.benchmark, args.batch_size)
+        return
+
+    lines = queue.Queue()
+    if args.file:
+        reader = threading.Thread(target=tail_file, args=(args.file, lines, args.from_start), daemon=True)
+    else:
+        host, port = args.socket.rsplit(':', 1)
+        reader = threading.Thread(target=serve_socket, args=(host, int(port), lines), daemon=True)
+    reader.start()
+    print(f"✅ Ingesting from {args.file or args.socket}")
+
+    last_report = time.monotonic()
+    reported = 0
+    try:
+        while True:
+            batch = []
+            deadline = time.monotonic() + args.max_latency
+            while len(batch) < args.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(lines.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                # Pick up a newly published model between batches
+                try:
+                    processor.model = get_cached_model(args.model)
+                    processor.process_lines(batch)
+                except Exception as e:
+                    # Drop the failed batch and keep ingesting
+                    processor.rejected += len(batch)
+                    print(f"Error processing a batch of {len(batch)} readings: {e}")
+
+            now = time.monotonic()
+            if now - last_report >= args.report_interval:
+                rate = (processor.processed - reported) / (now - last_report)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {processor.processed} readings, "
+                      f"{rate:,.0f}/s, {len(processor.windows)} sites, {processor.rejected} rejected, "
+                      f"queue {lines.qsize()}")
+                last_report, reported = now, processor.processed
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Memory regression check for the data loaders and dashboard render paths.
+
+Builds a synthetic prediction store of --rows rows in a temporary directory,
+runs each instrumented path under tracemalloc and reports its peak and
+retained allocations. With --check the peaks are compared against the
+baseline file and the script exits with status 1 when any path grew by more
+than the tolerance; --update-baseline records the current figures instead.
+
+Usage:
+    python memory_check.py
+    python memory_check.py --check
+    python memory_check.py --update-baseline
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS
+from utils.memory_profiler import MB, start_profiling, track_memory
+
+BASELINE_PATH = "memory_baseline.json"
+
+
+def build_store(directory, rows, seed=0):
+    """Write a synthetic users.csv and predictions.csv drawn from the training data"""
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv("your_dataset.csv").dropna()[FEATURE_COLUMNS]
+    predictions_df = base.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+    user_ids = [f"user-{i}" for i in range(200)]
+    regions = [(f"State{i % 6}", f"Region{i}") for i in range(30)]
+    region_index = rng.integers(0, len(regions), size=rows)
+    predictions_df.insert(0, 'prediction_id', [f"pred_synthetic_{i}" for i in range(rows)])
+    predictions_df.insert(1, 'user_id', rng.choice(user_ids, size=rows))
+    predictions_df.insert(2, 'region', [regions[i][1] for i in region_index])
+    predictions_df.insert(3, 'state', [regions[i][0] for i in region_index])
+    timestamps = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 90 * 86400, size=rows)), unit='s')
+    predictions_df.insert(4, 'timestamp', timestamps.strftime("%Y-%m-%d %H:%M:%S"))
+    predictions_df.insert(5, 'potability', rng.integers(0, 2, size=rows))
+    predictions_df.insert(6, 'confidence', rng.uniform(50, 100, size=rows).round(1))
+
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    predictions_df.to_csv(os.path.join(directory, "data", "predictions.csv"), index=False)
+    pd.DataFrame({
+        'user_id': user_ids,
+        'username': [f"name{i}" for i in range(len(user_ids))],
+        'email': [f"name{i}@example.com" for i in range(len(user_ids))],
+        'password_hash': "x",
+        'registration_date': "2025-01-01 00:00:00",
+    }).to_csv(os.path.join(directory, "data", "users.csv"), index=False)
+
+
+def run_scenarios():
+    """Run every path once under tracemalloc and return {name: {'peak': MB, 'retained': MB}}"""
+    from utils.data_handler import get_all_predictions, get_user_predictions, get_all_users, export_data_csv
+    from utils.query_engine import query_predictions, get_filtered_aggregates
+    from utils.shared_cache import compute_aggregates
+    from utils.visualizations import (
+        create_potability_pie_chart,
+        create_regional_bar_chart,
+        create_parameter_violation_chart,
+        create_user_activity_chart,
+        create_trends_over_time,
+    )
+
+    scenarios = [
+        ('load_predictions_cold', lambda: get_all_predictions()),
+        ('load_predictions_warm', lambda: get_all_predictions()),
+        ('load_users', lambda: get_all_users()),
+        ('user_predictions', lambda: get_user_predictions("user-7")),
+        ('compute_aggregates', lambda: compute_aggregates(get_all_predictions())),
+        ('query_filtered', lambda: query_predictions({'state': ['State1'], 'potability': 1})),
+        ('filtered_aggregates', lambda: get_filtered_aggregates({'state': ['State2']})),
+        ('overview_charts', lambda: [create_potability_pie_chart(get_all_predictions()),
+                                     create_regional_bar_chart(get_all_predictions()),
+                                     create_parameter_violation_chart(get_all_predictions())]),
+        ('user_activity_chart', lambda: create_user_activity_chart(get_all_predictions())),
+        ('trends_chart', lambda: create_trends_over_time(get_all_predictions())),
+        ('export_csv', lambda: export_data_csv(get_all_predictions())),
+    ]
+
+    results = {}
+    start_profiling()
+    for name, scenario in scenarios:
+        usage = {}
+        with track_memory(f"check.{name}", usage):
+            output = scenario()
+        del output
+        results[name] = {'peak': round(usage['peak'] / MB, 2), 'retained': round(usage['retained'] / MB, 2)}
+    return results
+
+
+def compare(results, baseline, tolerance, slack_mb):
+    """Return the names of paths whose peak grew beyond the baseline"""
+    regressions = []
+    for name, usage in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if usage['peak'] > expected['peak'] * (1 + tolerance) + slack_mb:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory use of the data and dashboard paths")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic predictions to generate")
+    parser.add_argument("--check", action="store_true", help="Fail when a path exceeds the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the current figures as the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative growth of a peak")
+    parser.add_argument("--slack-mb", type=float, default=1.0, help="Allowed absolute growth of a peak in MB")
+    args = parser.parse_args()
+
+    repo_dir = os.getcwd()
+    baseline_path = os.path.abspath(args.baseline)
+    work_dir = tempfile.mkdtemp(prefix="wq_memory_")
+    try:
+        build_store(work_dir, args.rows)
+        os.chdir(work_dir)
+        results = run_scenarios()
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    scenario_baseline = baseline.get('scenarios', {}) if baseline.get('rows') == args.rows else {}
+
+    print(f"{'Path':<24}{'Peak MB':>10}{'Retained MB':>14}{'Baseline MB':>14}")
+    for name, usage in results.items():
+        expected = scenario_baseline.get(name, {}).get('peak')
+        print(f"{name:<24}{usage['peak']:>10.2f}{usage['retained']:>14.2f}{expected if expected is not None else '-':>14}")
+
+    if args.update_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump({'rows': args.rows, 'scenarios': results}, f, indent=2)
+        print(f"✅ Baseline written to {args.baseline}")
+        return
+
+    if args.check:
+        if not scenario_baseline:
+            print(f"No baseline for {args.rows} rows in {args.baseline}; run with --update-baseline first")
+            sys.exit(1)
+        regressions = compare(results, scenario_baseline, args.tolerance, args.slack_mb)
+        if regressions:
+            print(f"❌ Memory regression in: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No memory regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,37 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from utils.data_handler import get_all_users, get_all_predictions, export_data_csv
+from utils.data_handler import get_all_users, get_data_version, export_data_csv
+from utils.auth import bulk_register_users
+from utils.archive import get_archive_summary
+from utils.approx_analytics import APPROX_ENABLED, get_approximate_summary
+from utils.memory_profiler import profile_memory, is_profiling, get_memory_report, top_allocations
+from utils.admission import get_admission_controller
+from utils.startup import get_startup_status
+from utils.region_stats import get_region_stats_summary
+from utils.ml_model import FEATURE_COLUMNS, format_confidence, get_scoring_path_stats
+from utils.query_engine import (
+    query_predictions,
+    query_archived_predictions,
+    aggregate_predictions,
+    get_filtered_aggregates,
+    get_filter_options,
+    has_filters,
+    GROUP_BY_COLUMNS,
+    METRIC_COLUMNS,
+    METRIC_FUNCTIONS
+)
 from utils.visualizations import (
     create_potability_pie_chart, 
     create_regional_bar_chart,
     create_parameter_violation_chart,
     create_user_activity_chart,
-    create_trends_over_time
+    create_trends_over_time,
+    create_influence_chart
 )
 
+ADMIN_SECTIONS = ["📊 Analytics Overview", "👥 User Management", "📈 Detailed Analytics", "📁 Data Export"]
+
 def show_admin_dashboard():
     """Display admin dashboard with analytics and user management"""
     
@@ -29,37 +51,241 @@ def show_admin_dashboard():
     
     st.markdown("---")
     
-    # Load data
-    users_df = get_all_users()
-    predictions_df = get_all_predictions()
+    # Filters apply to every section below
+    filters = show_filter_bar()
     
-    # Create tabs for different admin functions
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Analytics Overview", "👥 User Management", "📈 Detailed Analytics", "📁 Data Export"])
+    # Only the selected section runs; st.tabs would execute every tab body on each rerun
+    section = st.radio("Section", ADMIN_SECTIONS, horizontal=True, label_visibility="collapsed", key="admin_section")
+    
+    if section == ADMIN_SECTIONS[0]:
+        show_analytics_overview(filters)
+    elif section == ADMIN_SECTIONS[1]:
+        show_user_management(filters)
+    elif section == ADMIN_SECTIONS[2]:
+        show_detailed_analytics(filters)
+    else:
+        show_data_export(filters)
     
-    with tab1:
-        show_analytics_overview(users_df, predictions_df)
+    show_prediction_load()
+    show_startup_status()
     
-    with tab2:
-        show_user_management(users_df, predictions_df)
+    if is_profiling():
+        show_memory_profile()
+
+def show_prediction_load():
+    """Show load on the prediction path: active slots, queue depth and rejections since startup"""
+    metrics = get_admission_controller().get_metrics()
+    with st.expander("🚦 Prediction Load"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Running", f"{metrics['active']} / {metrics['max_concurrent']}")
+        col2.metric("Queued", f"{metrics['queue_depth']} / {metrics['max_queue']}", help=f"Peak queue depth: {metrics['max_queue_depth']}")
+        col3.metric("Admitted", metrics['admitted'], help=f"{metrics['queued']} had to wait")
+        col4.metric("Avg Wait", f"{metrics['avg_wait_seconds']:.2f}s")
+        st.dataframe(pd.DataFrame([{
+            'Rate Limited': metrics['rejected_rate_limited'],
+            'Queue Full': metrics['rejected_queue_full'],
+            'Timed Out': metrics['rejected_timeout'],
+        }]), use_container_width=True, hide_index=True)
+        paths = get_scoring_path_stats()
+        if paths['total']:
+            st.caption(f"Rule fast path decided {paths['fast_path_share']:.0%} of {paths['total']} scored samples "
+                       f"({paths['rule_drinkable']} drinkable, {paths['rule_not_drinkable']} not drinkable); "
+                       f"{paths['model']} went to the model.")
+
+def show_startup_status():
+    """Show whether the one-time startup has finished and how long each step took"""
+    status = get_startup_status()
+    labels = {'ready': "✅ Ready", 'degraded': "⚠️ Ready with failed steps", 'starting': "⏳ Warming up"}
+    with st.expander(f"🚀 Startup: {labels.get(status['status'], status['status'])}"):
+        if status.get('elapsed') is not None:
+            st.caption(f"Warming up for {status['elapsed']:.1f}s" if status['status'] == 'starting' else f"Startup took {status['elapsed']:.1f}s")
+        steps_df = pd.DataFrame([
+            {'Step': name, 'Status': step['status'], 'Seconds': step['seconds'], 'Error': step['error'] or ''}
+            for name, step in status['steps'].items()
+        ])
+        if not steps_df.empty:
+            st.dataframe(steps_df, use_container_width=True, hide_index=True)
+
+def show_memory_profile():
+    """Show peak and retained allocations of the instrumented render paths and loaders"""
+    with st.expander("🧠 Memory Profile"):
+        report = get_memory_report()
+        if report.empty:
+            st.info("No instrumented paths have run yet.")
+        else:
+            st.dataframe(report, use_container_width=True, hide_index=True)
+        if st.button("Show largest live allocations", key="memory_top_allocations"):
+            st.dataframe(pd.DataFrame(top_allocations(), columns=['Location', 'MB']).round(2), use_container_width=True, hide_index=True)
+
+def show_filter_bar():
+    """Show the drill-down filter bar and return the active filter spec"""
+    options = load_filter_options(get_data_version())
+    users_df = get_users()
+    usernames = dict(zip(users_df['user_id'], users_df['username'])) if not users_df.empty else {}
+    
+    with st.expander("🔎 Filters", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            states = st.multiselect("State", options['states'], key="filter_states")
+            region_options = sorted({
+                region for state in (states or options['states']) for region in options['regions'].get(state, [])
+            })
+            regions = st.multiselect("Region", region_options, key="filter_regions")
+            user_ids = st.multiselect("User", options['users'], key="filter_users",
+                                      format_func=lambda user_id: usernames.get(user_id, user_id))
+        
+        with col2:
+            date_min = pd.to_datetime(options['date_min']).date() if options['date_min'] else None
+            date_max = pd.to_datetime(options['date_max']).date() if options['date_max'] else None
+            date_from = st.date_input("From", value=None, min_value=date_min, max_value=date_max, key="filter_date_from")
+            date_to = st.date_input("To", value=None, min_value=date_min, max_value=date_max, key="filter_date_to")
+            potability = st.selectbox("Potability", ["All", "Drinkable", "Not Drinkable"], key="filter_potability")
+        
+        with col3:
+            violations_of = st.multiselect("Violating safe range", FEATURE_COLUMNS, key="filter_violations")
+            range_param = st.selectbox("Parameter range", ["None"] + FEATURE_COLUMNS, key="filter_range_param")
+            parameter_ranges = {}
+            if range_param != "None":
+                low = st.number_input(f"Min {range_param}", value=None, key="filter_range_low")
+                high = st.number_input(f"Max {range_param}", value=None, key="filter_range_high")
+                parameter_ranges[range_param] = (low, high)
+    
+    filters = {
+        'state': states,
+        'region': regions,
+        'user_id': user_ids,
+        'date_from': date_from.strftime('%Y-%m-%d') if date_from else None,
+        'date_to': date_to.strftime('%Y-%m-%d') if date_to else None,
+        'potability': {"All": None, "Drinkable": 1, "Not Drinkable": 0}[potability],
+        'violations_of': violations_of,
+        'parameter_ranges': parameter_ranges
+    }
+    if has_filters(filters):
+        matches, access_path = build_match_count(get_data_version(), filters)
+        st.caption(f"🔎 Showing {matches} matching predictions (access path: {access_path})")
+    return filters
+
+# Cached builders are keyed on the data version and filters, so charts and groupbys
+# are only rebuilt after a write or a filter change
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_users(version):
+    """Read the users table once per users-table version"""
+    return get_all_users()
+
+def get_users():
+    return load_users(get_data_version('users'))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_filter_options(version):
+    """Distinct states, regions, users and date bounds for the filter bar"""
+    return get_filter_options()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_match_count(version, filters):
+    """Number of hot-store predictions matching the filters, and the access path used"""
+    predictions_df, access_path = query_predictions(filters)
+    return len(predictions_df), access_path
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_user_predictions(version, filters, user_id):
+    """One user's predictions among those matching the filters"""
+    predictions_df, _ = query_predictions(filters)
+    return predictions_df[predictions_df['user_id'] == user_id] if not predictions_df.empty else predictions_df
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_export_predictions(version, filters, include_archive):
+    """Predictions matching the filters, with the matching archived rows when asked"""
+    predictions_df, _ = query_predictions(filters)
+    if include_archive:
+        archived_df = query_archived_predictions(filters)
+        if not archived_df.empty:
+            predictions_df = pd.concat([predictions_df, archived_df], ignore_index=True)
+    return predictions_df
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_filtered_aggregates(version, filters):
+    """Overview aggregates for the current data and filters; unfiltered totals include the archive"""
+    return get_filtered_aggregates(filters, include_archive=True)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_recent_activity(version, filters, since):
+    """Count, drinkable count and most active regions of the predictions made since a timestamp"""
+    predictions_df, _ = query_predictions(filters)
+    recent_predictions = predictions_df[pd.to_datetime(predictions_df['timestamp']) >= pd.Timestamp(since)]
+    if recent_predictions.empty:
+        return None
+    return {
+        'total': len(recent_predictions),
+        'drinkable': int((recent_predictions['potability'] == 1).sum()),
+        'top_regions': recent_predictions['region'].value_counts().head(3).to_dict()
+    }
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_overview_charts(version, filters):
+    """Build the overview figures for the current data"""
+    predictions_df, _ = query_predictions(filters)
+    return (
+        create_potability_pie_chart(predictions_df),
+        create_regional_bar_chart(predictions_df),
+        create_parameter_violation_chart(predictions_df)
+    )
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_user_summary(version, filters):
+    """Join users with their prediction counts and last activity"""
+    users_df = get_all_users()
+    predictions_df, _ = query_predictions(filters)
+    if users_df.empty or predictions_df.empty:
+        return users_df, None
     
-    with tab3:
-        show_detailed_analytics(predictions_df)
+    user_activity = predictions_df.groupby('user_id').agg({
+        'potability': 'count',
+        'timestamp': 'max'
+    }).rename(columns={'potability': 'total_predictions', 'timestamp': 'last_activity'})
     
-    with tab4:
-        show_data_export(users_df, predictions_df)
+    user_summary = users_df.merge(user_activity, left_on='user_id', right_index=True, how='left')
+    user_summary['total_predictions'] = user_summary['total_predictions'].fillna(0).astype(int)
+    user_summary['last_activity'] = user_summary['last_activity'].astype(object).fillna('Never')
+    return users_df, user_summary
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_user_activity_chart(version, filters):
+    """Build the most-active-users chart"""
+    return create_user_activity_chart(query_predictions(filters)[0])
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_detailed_analytics(version, filters):
+    """Build the trends chart and regional statistics table"""
+    predictions_df, _ = query_predictions(filters)
+    trends_chart = create_trends_over_time(predictions_df)
+    regional_stats = None
+    if 'region' in predictions_df.columns and 'state' in predictions_df.columns:
+        regional_stats = predictions_df.groupby(['state', 'region']).agg({
+            'potability': ['count', 'mean'],
+            'confidence': 'mean'
+        }).round(2)
+        regional_stats.columns = ['Total_Samples', 'Potability_Rate', 'Avg_Confidence']
+    return trends_chart, regional_stats
 
-def show_analytics_overview(users_df, predictions_df):
+@st.fragment
+@profile_memory()
+def show_analytics_overview(filters):
     """Show high-level analytics overview"""
     
     st.subheader("📊 System Overview")
     
+    users_df = get_users()
+    aggregates = build_filtered_aggregates(get_data_version(), filters)
+    
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
     
     total_users = len(users_df) if not users_df.empty else 0
-    total_predictions = len(predictions_df) if not predictions_df.empty else 0
-    drinkable_count = len(predictions_df[predictions_df['potability'] == 1]) if not predictions_df.empty else 0
-    avg_confidence = predictions_df['confidence'].mean() if not predictions_df.empty else 0
+    total_predictions = aggregates['total_predictions']
+    drinkable_count = aggregates['drinkable_count']
+    avg_confidence = aggregates['avg_confidence']
     
     with col1:
         st.metric("Total Users", total_users)
@@ -70,51 +296,105 @@ def show_analytics_overview(users_df, predictions_df):
     with col4:
         st.metric("Avg Confidence", f"{avg_confidence:.1f}%" if avg_confidence > 0 else "0%")
     
-    if not predictions_df.empty:
+    archived_predictions = 0
+    archive_summary = get_archive_summary()
+    if not archive_summary.empty:
+        if has_filters(filters):
+            st.caption("Filtered figures cover the hot store only; archived predictions are not included.")
+        else:
+            archived_predictions = int(archive_summary['rows'].sum())
+            st.caption(f"Totals include {archived_predictions} archived predictions; the charts cover the hot store.")
+    
+    if total_predictions > archived_predictions:
+        pie_chart, bar_chart, violation_chart = build_overview_charts(get_data_version(), filters)
+        
         # Visualization row 1
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Water Potability Distribution")
-            pie_chart = create_potability_pie_chart(predictions_df)
             st.plotly_chart(pie_chart, use_container_width=True)
         
         with col2:
             st.subheader("Predictions by Region")
-            bar_chart = create_regional_bar_chart(predictions_df)
             st.plotly_chart(bar_chart, use_container_width=True)
         
         # Visualization row 2
         st.subheader("Parameter Violations Analysis")
-        violation_chart = create_parameter_violation_chart(predictions_df)
         st.plotly_chart(violation_chart, use_container_width=True)
         
+        # Model explanation aggregated over all explained predictions
+        mean_abs_contributions = aggregates.get('mean_abs_contributions')
+        if mean_abs_contributions:
+            st.subheader("What Drives the Model's Decisions")
+            st.plotly_chart(create_influence_chart(mean_abs_contributions), use_container_width=True)
+        
+    elif archived_predictions:
+        st.info("📝 All predictions have been archived; there is no recent data to chart.")
     else:
         st.info("📝 No prediction data available yet.")
+    
+    if APPROX_ENABLED:
+        show_approximate_analytics(filters)
 
-def show_user_management(users_df, predictions_df):
+def show_approximate_analytics(filters):
+    """Show sketch-based metrics over the whole history, archive included"""
+    
+    st.subheader("≈ Approximate Analytics (full history)")
+    summary = get_approximate_summary(filters.get('date_from'), filters.get('date_to'),
+                                      filters.get('state'), filters.get('region'))
+    if not summary or summary['count'] == 0:
+        st.info("No sketches available for this selection yet.")
+        return
+    
+    unsupported = [name for name in ('user_id', 'potability', 'parameter_ranges', 'violations_of') if filters.get(name)]
+    if unsupported:
+        st.caption("Sketches are kept per day and region, so only the state, region and date filters apply here.")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Samples", f"{summary['count']:,}")
+    with col2:
+        st.metric("Drinkable", f"{summary['drinkable'] / summary['count']:.1%}")
+    with col3:
+        st.metric("Distinct Contributors", f"≈{summary['distinct_users']:,}",
+                  help=f"HyperLogLog estimate, standard error ±{summary['distinct_users_error']:.1%}")
+    with col4:
+        st.metric("Avg Confidence", f"{summary['avg_confidence']:.1f}%")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write(f"**Parameter Quantiles** (rank error about ±{summary['quantile_rank_error']:.1%})")
+        st.dataframe(summary['quantiles'], use_container_width=True)
+    with col2:
+        st.write("**Samples by Region**")
+        st.dataframe(pd.DataFrame(list(summary['region_counts'].items())[:10], columns=['Region', 'Samples']),
+                     use_container_width=True, hide_index=True)
+        if summary['top_contributors']:
+            st.write(f"**Top Contributors** (all regions, overcount at most {summary['contributor_error']:.0f})")
+            users_df = get_users()
+            usernames = dict(zip(users_df['user_id'], users_df['username'])) if not users_df.empty else {}
+            st.dataframe(pd.DataFrame([(usernames.get(user, user), count) for user, count in summary['top_contributors']],
+                                      columns=['User', 'Samples']), use_container_width=True, hide_index=True)
+    st.caption(f"Merged from {summary['days']} daily sketches.")
+
+@st.fragment
+@profile_memory()
+def show_user_management(filters):
     """Show user management interface"""
     
     st.subheader("👥 User Management")
     
+    version = get_data_version()
+    users_df, user_summary = build_user_summary(version, filters)
+    
     if not users_df.empty:
         # User statistics
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("User Statistics")
-            if not predictions_df.empty:
-                # Calculate user activity
-                user_activity = predictions_df.groupby('user_id').agg({
-                    'potability': 'count',
-                    'timestamp': 'max'
-                }).rename(columns={'potability': 'total_predictions', 'timestamp': 'last_activity'})
-                
-                # Merge with user data
-                user_summary = users_df.merge(user_activity, left_on='user_id', right_index=True, how='left')
-                user_summary['total_predictions'] = user_summary['total_predictions'].fillna(0).astype(int)
-                user_summary['last_activity'] = user_summary['last_activity'].fillna('Never')
-                
+            if user_summary is not None:
                 st.dataframe(user_summary[['username', 'email', 'registration_date', 'total_predictions', 'last_activity']], 
                            use_container_width=True)
             else:
@@ -122,8 +402,8 @@ def show_user_management(users_df, predictions_df):
         
         with col2:
             st.subheader("User Activity Chart")
-            if not predictions_df.empty:
-                activity_chart = create_user_activity_chart(predictions_df)
+            if user_summary is not None:
+                activity_chart = build_user_activity_chart(version, filters)
                 st.plotly_chart(activity_chart, use_container_width=True)
             else:
                 st.info("No user activity data to display")
@@ -135,6 +415,7 @@ def show_user_management(users_df, predictions_df):
         if selected_user:
             user_info = users_df[users_df['username'] == selected_user].iloc[0]
             user_id = user_info['user_id']
+            user_predictions = build_user_predictions(version, filters, user_id) if user_summary is not None else pd.DataFrame()
             
             col1, col2 = st.columns(2)
             
@@ -145,43 +426,73 @@ def show_user_management(users_df, predictions_df):
                 st.write(f"Registration Date: {user_info['registration_date']}")
             
             with col2:
-                if not predictions_df.empty:
-                    user_predictions = predictions_df[predictions_df['user_id'] == user_id]
-                    if not user_predictions.empty:
-                        st.write("**Activity Summary:**")
-                        st.write(f"Total Predictions: {len(user_predictions)}")
-                        st.write(f"Drinkable Results: {len(user_predictions[user_predictions['potability'] == 1])}")
-                        st.write(f"Last Activity: {user_predictions['timestamp'].max()}")
-                    else:
-                        st.write("**Activity Summary:**")
-                        st.write("No predictions made yet")
+                st.write("**Activity Summary:**")
+                if not user_predictions.empty:
+                    st.write(f"Total Predictions: {len(user_predictions)}")
+                    st.write(f"Drinkable Results: {len(user_predictions[user_predictions['potability'] == 1])}")
+                    st.write(f"Last Activity: {user_predictions['timestamp'].max()}")
                 else:
-                    st.write("**Activity Summary:**")
                     st.write("No predictions made yet")
             
             # User prediction history
-            if not predictions_df.empty:
-                user_predictions = predictions_df[predictions_df['user_id'] == user_id]
-                if not user_predictions.empty:
-                    st.subheader(f"Prediction History for {selected_user}")
-                    display_columns = ['timestamp', 'region', 'state', 'potability', 'confidence', 'pH', 'Solids', 'Chloramines']
-                    display_df = user_predictions[display_columns].copy()
-                    display_df['potability'] = display_df['potability'].map({1: '✅ Drinkable', 0: '❌ Not Drinkable'})
-                    display_df['confidence'] = display_df['confidence'].apply(lambda x: f"{x:.1f}%")
-                    st.dataframe(display_df.sort_values('timestamp', ascending=False), use_container_width=True)
+            if not user_predictions.empty:
+                st.subheader(f"Prediction History for {selected_user}")
+                display_columns = ['timestamp', 'region', 'state', 'potability', 'confidence', 'pH', 'Solids', 'Chloramines']
+                display_df = user_predictions[display_columns].copy()
+                display_df['potability'] = display_df['potability'].map({1: '✅ Drinkable', 0: '❌ Not Drinkable'})
+                display_df['confidence'] = display_df['confidence'].apply(format_confidence)
+                st.dataframe(display_df.sort_values('timestamp', ascending=False), use_container_width=True)
     
     else:
         st.info("📝 No users registered yet.")
+    
+    show_bulk_provisioning()
+
+def show_bulk_provisioning():
+    """Create many user accounts from an uploaded CSV roster"""
+    
+    with st.expander("📥 Bulk User Provisioning"):
+        st.write("Upload a CSV with **username**, **email** and **password** columns. "
+                 "Valid rows are created together; rejected rows are listed with the reason.")
+        roster_file = st.file_uploader("User roster (CSV)", type=['csv'], key="bulk_roster")
+        
+        if roster_file is not None and st.button("Create Accounts", key="bulk_create"):
+            try:
+                roster_df = pd.read_csv(roster_file, dtype=str)
+            except Exception as e:
+                st.error(f"Could not read the roster: {str(e)}")
+                roster_df = None
+            if roster_df is not None:
+                with st.spinner(f"Provisioning {len(roster_df)} users..."):
+                    created, rejections = bulk_register_users(roster_df)
+                st.session_state.bulk_result = (created, rejections)
+                # Rerun the section so the user tables include the new accounts
+                st.rerun()
+        
+        if 'bulk_result' in st.session_state:
+            created, rejections = st.session_state.bulk_result
+            if created:
+                st.success(f"✅ Created {created} user accounts")
+            if rejections:
+                st.warning(f"⚠️ {len(rejections)} rows were rejected")
+                st.dataframe(pd.DataFrame(rejections), use_container_width=True)
 
-def show_detailed_analytics(predictions_df):
+@st.fragment
+@profile_memory()
+def show_detailed_analytics(filters):
     """Show detailed analytics and trends"""
     
     st.subheader("📈 Detailed Analytics")
     
-    if not predictions_df.empty:
+    version = get_data_version()
+    matches, _ = build_match_count(version, filters)
+    aggregates = build_filtered_aggregates(version, filters)
+    
+    if matches > 0:
+        trends_chart, regional_stats = build_detailed_analytics(version, filters)
+        
         # Time-based analytics
         st.subheader("Trends Over Time")
-        trends_chart = create_trends_over_time(predictions_df)
         st.plotly_chart(trends_chart, use_container_width=True)
         
         # Parameter statistics
@@ -192,60 +503,98 @@ def show_detailed_analytics(predictions_df):
         with col1:
             st.write("**Average Parameter Values (All Samples)**")
             param_columns = ['pH', 'Solids', 'Sulfate', 'Organic_carbon', 'Turbidity', 'Hardness', 'Chloramines', 'Conductivity', 'Trihalomethanes']
-            avg_params = predictions_df[param_columns].mean()
+            avg_params = aggregates['parameter_means']
             for param, value in avg_params.items():
                 st.write(f"{param}: {value:.2f}")
         
         with col2:
             st.write("**Average Parameter Values by Potability**")
-            drinkable_avg = predictions_df[predictions_df['potability'] == 1][param_columns].mean()
-            not_drinkable_avg = predictions_df[predictions_df['potability'] == 0][param_columns].mean()
-            
+            means_by_potability = aggregates['parameter_means_by_potability']
             comparison_df = pd.DataFrame({
-                'Drinkable': drinkable_avg,
-                'Not Drinkable': not_drinkable_avg
+                'Drinkable': pd.Series(means_by_potability.get('1', {}), index=param_columns, dtype=float),
+                'Not Drinkable': pd.Series(means_by_potability.get('0', {}), index=param_columns, dtype=float)
             })
             st.dataframe(comparison_df)
         
         # Regional analysis
         st.subheader("Regional Analysis")
-        if 'region' in predictions_df.columns and 'state' in predictions_df.columns:
-            regional_stats = predictions_df.groupby(['state', 'region']).agg({
-                'potability': ['count', 'mean'],
-                'confidence': 'mean'
-            }).round(2)
-            
-            regional_stats.columns = ['Total_Samples', 'Potability_Rate', 'Avg_Confidence']
+        if regional_stats is not None:
             st.dataframe(regional_stats, use_container_width=True)
         
+        # Ad-hoc group-by over the filtered predictions
+        st.subheader("Custom Query")
+        col1, col2 = st.columns(2)
+        with col1:
+            group_by = st.multiselect("Group by", GROUP_BY_COLUMNS, default=['region'], key="query_group_by")
+        with col2:
+            metric_options = [f"{column}:{function}" for column in METRIC_COLUMNS for function in METRIC_FUNCTIONS]
+            metrics = st.multiselect("Metrics", metric_options, default=['potability:count', 'potability:mean'],
+                                     key="query_metrics")
+        query_result, access_path = aggregate_predictions(filters, group_by, metrics)
+        st.caption(f"Access path: {access_path}")
+        st.dataframe(query_result, use_container_width=True)
+        
+        # Streaming drift monitor, maintained on every saved prediction
+        st.subheader("Regional Drift Monitor")
+        drift_df = get_region_stats_summary()
+        if not drift_df.empty:
+            flagged = drift_df[drift_df['Anomaly'] != '']
+            if not flagged.empty:
+                for _, row in flagged.iterrows():
+                    st.warning(f"⚠️ {row['Region']}: {row['Anomaly']}")
+            else:
+                st.success("✅ No regions currently show anomalous readings.")
+            summary_columns = ['Region', 'Samples', 'Potability_Rate', 'Recent_Potability', 'Anomaly', 'Last_Anomaly']
+            st.dataframe(drift_df[summary_columns], use_container_width=True)
+            with st.expander("Running parameter means and standard deviations"):
+                st.dataframe(drift_df.drop(columns=summary_columns[2:]), use_container_width=True)
+        else:
+            st.write("No regional statistics collected yet.")
+        
         # Recent activity
         st.subheader("Recent Activity (Last 7 Days)")
-        recent_date = datetime.now() - timedelta(days=7)
-        predictions_df['timestamp_dt'] = pd.to_datetime(predictions_df['timestamp'])
-        recent_predictions = predictions_df[predictions_df['timestamp_dt'] >= recent_date]
+        # The cutoff is rounded to the minute so reruns within a minute reuse the cached result
+        recent_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M')
+        recent_activity = build_recent_activity(version, filters, recent_date)
         
-        if not recent_predictions.empty:
-            st.write(f"Total predictions in last 7 days: {len(recent_predictions)}")
-            st.write(f"Drinkable samples: {len(recent_predictions[recent_predictions['potability'] == 1])}")
-            st.write(f"Most active regions: {recent_predictions['region'].value_counts().head(3).to_dict()}")
+        if recent_activity:
+            st.write(f"Total predictions in last 7 days: {recent_activity['total']}")
+            st.write(f"Drinkable samples: {recent_activity['drinkable']}")
+            st.write(f"Most active regions: {recent_activity['top_regions']}")
         else:
             st.write("No recent activity in the last 7 days.")
     
     else:
         st.info("📝 No prediction data available for detailed analytics.")
 
-def show_data_export(users_df, predictions_df):
+@st.fragment
+@profile_memory()
+def show_data_export(filters):
     """Show data export functionality"""
     
     st.subheader("📁 Data Export")
+    
+    users_df = get_users()
+    archive_summary = get_archive_summary()
     st.write("Export system data for external analysis or backup purposes.")
     
+    include_archive = False
+    if not archive_summary.empty:
+        include_archive = st.checkbox(
+            f"Include archived predictions ({archive_summary['rows'].sum()} records in {len(archive_summary)} segments)",
+            key="export_include_archive"
+        )
+    predictions_df = build_export_predictions(get_data_version(), filters, include_archive)
+    
     col1, col2 = st.columns(2)
     
     with col1:
         st.write("**Available Data:**")
         st.write(f"- Users: {len(users_df)} records")
-        st.write(f"- Predictions: {len(predictions_df)} records")
+        st.write(f"- Predictions: {len(predictions_df)} records" + (" (filtered)" if has_filters(filters) else ""))
+        if not archive_summary.empty:
+            st.write(f"- Archive: {archive_summary['rows'].sum()} records, "
+                     f"{archive_summary['first_timestamp'].min()} to {archive_summary['last_timestamp'].max()}")
     
     with col2:
         st.write("**Export Options:**")
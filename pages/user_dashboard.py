@@ -2,9 +2,14 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from utils.ml_model import load_model, make_prediction, generate_precautions, get_parameter_analysis
-from utils.data_handler import save_prediction, get_user_predictions
-from utils.visualizations import create_user_history_chart
+from utils.ml_model import get_cached_model, make_prediction, format_confidence, count_safe_conditions, generate_precautions, get_parameter_analysis, get_feature_contributions, get_what_if_range, score_what_if_grid, FEATURE_COLUMNS, SAFE_RANGES, CONTRIBUTION_COLUMNS
+from utils.data_handler import save_prediction, get_user_predictions, get_data_version
+from utils.query_engine import get_user_delta
+from utils.memory_profiler import profile_memory
+from utils.admission import get_admission_controller, AdmissionRejected
+from utils.visualizations import create_user_history_chart, extend_user_history_chart, create_contribution_chart, create_what_if_chart
+
+HISTORY_COLUMNS = ['timestamp', 'region', 'state', 'potability', 'confidence', 'pH', 'Solids', 'Chloramines']
 
 def show_user_dashboard():
     """Display user dashboard with water quality prediction interface"""
@@ -33,6 +38,7 @@ def show_user_dashboard():
     with tab2:
         show_user_history()
 
+@profile_memory()
 def show_prediction_interface():
     """Show water quality prediction form and results"""
     
@@ -75,43 +81,88 @@ def show_prediction_interface():
                     'Trihalomethanes': trihalomethanes
                 }
                 
-                # Make prediction
+                # Make prediction; the admission controller bounds how many run at once
+                controller = get_admission_controller()
                 try:
-                    model = load_model()
-                    prediction, confidence = make_prediction(model, sample_data)
+                    if controller.is_busy():
+                        st.info("⏳ Many samples are being analyzed right now. Your request is queued and will run shortly.")
+                    with st.spinner("Analyzing sample..."), controller.admit(st.session_state.user_id) as waited:
+                        model = get_cached_model()
+                        prediction, confidence = make_prediction(model, sample_data)
+                        # Samples decided by the labelling rule never reach the model, so there is nothing to explain
+                        bias, contributions_df = (None, None) if np.isnan(confidence) else get_feature_contributions(model, [sample_data])
+                        contributions = contributions_df.iloc[0] if contributions_df is not None else None
+                        
+                        # Save prediction to database
+                        prediction_data = {
+                            'user_id': st.session_state.user_id,
+                            'region': region,
+                            'state': state,
+                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            'potability': prediction,
+                            'confidence': confidence,
+                            **sample_data
+                        }
+                        if contributions is not None:
+                            prediction_data.update(dict(zip(CONTRIBUTION_COLUMNS, contributions.round(4).tolist())))
+                        save_prediction(prediction_data)
+                    
+                    if waited >= 1:
+                        st.caption(f"Queued for {waited:.1f}s before analysis")
                     
-                    # Save prediction to database
-                    prediction_data = {
+                    # Keep the result so it survives reruns from the what-if controls
+                    st.session_state.last_result = {
                         'user_id': st.session_state.user_id,
+                        'sample_data': sample_data,
+                        'prediction': prediction,
+                        'confidence': confidence,
                         'region': region,
                         'state': state,
-                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        'potability': prediction,
-                        'confidence': confidence,
-                        **sample_data
+                        'contributions': contributions,
+                        'bias': bias,
+                        'analyzed_at': prediction_data['timestamp'],
                     }
-                    save_prediction(prediction_data)
-                    
-                    # Display results
-                    show_prediction_results(sample_data, prediction, confidence, region, state)
                     
+                except AdmissionRejected as e:
+                    show_admission_rejection(e)
                 except Exception as e:
                     st.error(f"Error making prediction: {str(e)}")
             else:
                 st.error("Please enter both region and state information")
+    
+    # Display results of the last analysis outside the form
+    result = st.session_state.get('last_result')
+    if result and result['user_id'] == st.session_state.user_id:
+        show_prediction_results(**{key: value for key, value in result.items() if key != 'user_id'})
+
+def show_admission_rejection(error):
+    """Explain why a sample was turned away; nothing was saved"""
+    retry = f" Please try again in about {int(np.ceil(error.retry_after))} seconds." if error.retry_after else " Please try again shortly."
+    if error.reason == 'rate_limited':
+        st.warning(f"⏱️ You are submitting samples too quickly.{retry}")
+    elif error.reason == 'queue_full':
+        st.warning(f"🚦 The system is at capacity and could not queue your sample.{retry}")
+    else:
+        st.warning(f"⌛ Your sample waited too long for a free slot and was not analyzed.{retry}")
+    st.caption("Your entries are kept in the form, so you can resubmit without retyping them.")
 
-def show_prediction_results(sample_data, prediction, confidence, region, state):
+def show_prediction_results(sample_data, prediction, confidence, region, state, contributions=None, bias=None, analyzed_at=None):
     """Display prediction results with analysis and suggestions"""
     
     st.markdown("---")
     st.subheader("🔬 Analysis Results")
     
     # Main result
+    if np.isnan(confidence):
+        safe_count = int(count_safe_conditions(pd.DataFrame([sample_data])).iloc[0])
+        basis = f"Decided by rule: {safe_count} of {len(FEATURE_COLUMNS)} parameters safe"
+    else:
+        basis = f"Confidence: {confidence:.1f}%"
     if prediction == 1:
-        st.success(f"✅ **The water is DRINKABLE** (Confidence: {confidence:.1f}%)")
+        st.success(f"✅ **The water is DRINKABLE** ({basis})")
         result_color = "green"
     else:
-        st.error(f"❌ **The water is NOT DRINKABLE** (Confidence: {confidence:.1f}%)")
+        st.error(f"❌ **The water is NOT DRINKABLE** ({basis})")
         result_color = "red"
     
     # Parameter analysis
@@ -136,7 +187,7 @@ def show_prediction_results(sample_data, prediction, confidence, region, state):
     styled_df = (
         analysis_df
         .style
-        .applymap(lambda v: 'background-color: lightgreen' if "Safe" in str(v) else 'background-color: lightcoral', subset=['Status'])
+        .map(lambda v: 'background-color: lightgreen' if "Safe" in str(v) else 'background-color: lightcoral', subset=['Status'])
         .set_table_styles([
             {'selector': 'th', 'props': [('text-align', 'center')]},
             {'selector': 'td', 'props': [('text-align', 'center')]}
@@ -153,60 +204,179 @@ def show_prediction_results(sample_data, prediction, confidence, region, state):
     else:
         st.write("✅ All parameters are within safe ranges. No specific precautions needed.")
     
+    # Which parameters drove the model's decision
+    if contributions is not None:
+        st.subheader("🧠 What Drove This Result")
+        st.plotly_chart(create_contribution_chart(contributions, bias), use_container_width=True)
+        st.caption("Green bars pushed the prediction towards drinkable, red bars towards not drinkable.")
+    
+    show_what_if(sample_data, prediction)
+    
     # Additional information
     with st.expander("ℹ️ Additional Information"):
         st.write(f"**Sample Location:** {region}, {state}")
-        st.write(f"**Analysis Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        st.write(f"**Analysis Time:** {analyzed_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         st.write("**Note:** This prediction is based on machine learning analysis. For critical decisions, please consult with water quality experts.")
 
+def _nearest_flip(sample_data, prediction, x_param, x_values, probabilities, y_param=None, y_values=None):
+    """Return the grid point closest to the sample (relative to each axis span) where the outcome flips, or None"""
+    flipped = (probabilities >= 50) != bool(prediction)
+    if not flipped.any():
+        return None
+    x_span = (x_values[-1] - x_values[0]) or 1.0
+    if y_param is None:
+        distance = np.abs(x_values - sample_data[x_param]) / x_span
+        index = np.argmin(np.where(flipped, distance, np.inf))
+        return {x_param: x_values[index]}
+    y_span = (y_values[-1] - y_values[0]) or 1.0
+    xs, ys = np.meshgrid(x_values, y_values)
+    distance = np.hypot((xs - sample_data[x_param]) / x_span, (ys - sample_data[y_param]) / y_span)
+    index = np.unravel_index(np.argmin(np.where(flipped, distance, np.inf)), distance.shape)
+    return {x_param: xs[index], y_param: ys[index]}
+
+@st.fragment
+def show_what_if(sample_data, prediction):
+    """Sweep one or two parameters around the sample and chart where the prediction flips; reruns only this section"""
+    st.subheader("🔀 What If?")
+    st.caption("See how the result would change if one or two parameters were different. The other parameters keep your sample's values.")
+    
+    # Start from a parameter that is out of range, since that is usually what users want to explore
+    unsafe = [param for param in FEATURE_COLUMNS
+              if not SAFE_RANGES[param][0] <= sample_data[param] <= SAFE_RANGES[param][1]]
+    default_x = FEATURE_COLUMNS.index(unsafe[0]) if unsafe else 0
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        x_param = st.selectbox("Parameter", FEATURE_COLUMNS, index=default_x, key="what_if_x")
+    with col2:
+        y_options = ["None"] + [param for param in FEATURE_COLUMNS if param != x_param]
+        y_choice = st.selectbox("Second parameter", y_options, key="what_if_y")
+        y_param = None if y_choice == "None" else y_choice
+    with col3:
+        steps = st.select_slider("Grid resolution", options=[25, 50, 75, 100], value=50, key="what_if_steps")
+    
+    ranges = {}
+    for param in [x_param] + ([y_param] if y_param else []):
+        low, high = get_what_if_range(param, sample_data[param])
+        ranges[param] = st.slider(f"{param} range", min_value=low, max_value=high * 2 if param != 'pH' else high,
+                                  value=(low, high), key=f"what_if_range_{param}")
+    
+    x_values = np.linspace(*ranges[x_param], steps)
+    y_values = np.linspace(*ranges[y_param], steps) if y_param else None
+    probabilities = score_what_if_grid(get_cached_model(), sample_data, x_param, x_values, y_param, y_values)
+    st.plotly_chart(create_what_if_chart(sample_data, x_param, x_values, probabilities, y_param, y_values), use_container_width=True)
+    
+    flip = _nearest_flip(sample_data, prediction, x_param, x_values, probabilities, y_param, y_values)
+    outcome = "drinkable" if prediction != 1 else "not drinkable"
+    if flip is None:
+        st.info(f"Within these ranges the result stays {'drinkable' if prediction == 1 else 'not drinkable'}.")
+    else:
+        changes = " and ".join(f"**{param}** from {sample_data[param]:.2f} to {value:.2f}" for param, value in flip.items())
+        st.write(f"Closest change that makes the sample {outcome}: {changes}.")
+
+def _format_history(rows):
+    """Format prediction rows for the history table"""
+    display_df = rows[HISTORY_COLUMNS].copy()
+    display_df['potability'] = display_df['potability'].astype(int).map({1: '✅ Drinkable', 0: '❌ Not Drinkable'})
+    display_df['confidence'] = display_df['confidence'].astype(float).apply(format_confidence)
+    return display_df
+
+def _append_history(cache, new_rows):
+    """Fold rows newer than the high-water mark into the cached history, metrics, chart and table"""
+    if new_rows.empty:
+        return
+    new_rows = new_rows.sort_values('timestamp')
+    timestamps = new_rows['timestamp'].astype(str)
+    
+    cache['total'] += len(new_rows)
+    cache['drinkable'] += int((new_rows['potability'] == 1).sum())
+    cache['confidence_sum'] += float(new_rows['confidence'].sum())
+    cache['confidence_count'] += int(new_rows['confidence'].notna().sum())
+    
+    # High-water mark: latest timestamp plus the ids already seen at that timestamp
+    latest = timestamps.max()
+    latest_ids = set(new_rows.loc[timestamps == latest, 'prediction_id'].astype(str))
+    if cache['last_timestamp'] == latest:
+        cache['last_ids'] |= latest_ids
+    elif cache['last_timestamp'] is None or latest > cache['last_timestamp']:
+        cache['last_timestamp'], cache['last_ids'] = latest, latest_ids
+    
+    newest_first = new_rows.iloc[::-1]
+    cache['history'] = pd.concat([newest_first, cache['history']], ignore_index=True) if not cache['history'].empty else newest_first
+    cache['table'] = pd.concat([_format_history(newest_first), cache['table']], ignore_index=True) if not cache['table'].empty else _format_history(newest_first)
+    
+    if cache['chart'] is not None:
+        extend_user_history_chart(cache['chart'], new_rows)
+    elif cache['total'] > 1:
+        cache['chart'] = create_user_history_chart(cache['history'].sort_values('timestamp').copy())
+
+def _load_history(user_id, include_archive, version):
+    """Build the session history cache from a full read of the user's predictions"""
+    _, hot_count = get_user_delta(user_id)
+    cache = {
+        'user_id': user_id, 'include_archive': include_archive, 'version': version, 'hot_count': hot_count,
+        'history': pd.DataFrame(), 'table': pd.DataFrame(), 'chart': None,
+        'total': 0, 'drinkable': 0, 'confidence_sum': 0.0, 'confidence_count': 0, 'last_timestamp': None, 'last_ids': set()
+    }
+    _append_history(cache, get_user_predictions(user_id, include_archive=include_archive))
+    return cache
+
+def refresh_user_history(user_id, include_archive=False):
+    """Return the user's history cache, fetching only predictions saved since the last render"""
+    version = get_data_version('predictions')
+    cache = st.session_state.get('history_cache')
+    if cache is None or cache['user_id'] != user_id or cache['include_archive'] != include_archive:
+        cache = _load_history(user_id, include_archive, version)
+    elif cache['version'] != version:
+        new_rows, hot_count = get_user_delta(user_id, cache['last_timestamp'], cache['last_ids'])
+        if cache['hot_count'] + len(new_rows) == hot_count:
+            _append_history(cache, new_rows)
+            cache['hot_count'], cache['version'] = hot_count, version
+        else:
+            # Rows were removed or rewritten (compaction, out-of-order timestamps); start over
+            cache = _load_history(user_id, include_archive, version)
+    st.session_state.history_cache = cache
+    return cache
+
+@profile_memory()
 def show_user_history():
     """Display user's prediction history"""
     
     st.subheader("📊 Your Prediction History")
     
-    # Get user predictions
-    user_predictions = get_user_predictions(st.session_state.user_id)
+    # Get user predictions; only rows saved since the last render are fetched
+    include_archive = st.checkbox("Include archived predictions", key="history_include_archive")
+    history = refresh_user_history(st.session_state.user_id, include_archive=include_archive)
     
-    if not user_predictions.empty:
+    if history['total'] > 0:
         # Summary statistics
         col1, col2, col3, col4 = st.columns(4)
         
-        total_tests = len(user_predictions)
-        drinkable_count = len(user_predictions[user_predictions['potability'] == 1])
-        avg_confidence = user_predictions['confidence'].mean()
-        latest_test = user_predictions['timestamp'].max()
+        total_tests = history['total']
+        drinkable_count = history['drinkable']
+        # Rule-decided samples have no confidence and are left out of the average
+        avg_confidence = history['confidence_sum'] / history['confidence_count'] if history['confidence_count'] else None
+        latest_test = history['last_timestamp']
         
         with col1:
             st.metric("Total Tests", total_tests)
         with col2:
             st.metric("Drinkable Samples", f"{drinkable_count}/{total_tests}")
         with col3:
-            st.metric("Avg Confidence", f"{avg_confidence:.1f}%")
+            st.metric("Avg Confidence", f"{avg_confidence:.1f}%" if avg_confidence is not None else "N/A")
         with col4:
-            if not user_predictions.empty and 'timestamp' in user_predictions.columns:
-                latest_test_str = str(latest_test).split()[0] if pd.notna(latest_test) and str(latest_test) != 'nan' else "N/A"
-            else:
-                latest_test_str = "N/A"
+            latest_test_str = str(latest_test).split()[0] if latest_test and latest_test != 'nan' else "N/A"
             st.metric("Latest Test", latest_test_str)
         
         # History chart
-        if len(user_predictions) > 1:
+        if history['chart'] is not None:
             st.subheader("Prediction Trends")
-            chart = create_user_history_chart(user_predictions)
-            st.plotly_chart(chart, use_container_width=True)
+            st.plotly_chart(history['chart'], use_container_width=True)
         
         # Recent predictions table
         st.subheader("Recent Predictions")
-        display_columns = ['timestamp', 'region', 'state', 'potability', 'confidence', 'pH', 'Solids', 'Chloramines']
-        display_df = user_predictions[display_columns].copy()
-        # Create a copy and properly handle data types
-        display_df = display_df.copy()
-        display_df['potability'] = display_df['potability'].astype(int).map({1: '✅ Drinkable', 0: '❌ Not Drinkable'})
-        display_df['confidence'] = display_df['confidence'].astype(float).apply(lambda x: f"{x:.1f}%")
-        
-        sorted_df = display_df.sort_values('timestamp', ascending=False)
-        st.dataframe(sorted_df, use_container_width=True)
+        st.dataframe(history['table'], use_container_width=True)
         
     else:
         st.info("📝 No predictions yet. Start by testing a water sample!")
-        st.write("Use the 'Water Quality Test' tab to analyze your first water sample.")
\ No newline at end of file
+        st.write("Use the 'Water Quality Test' tab to analyze your first water sample.")
@@ -0,0 +1,50 @@
+"""Background incremental retraining from accumulated predictions.
+
+Runs as its own low-priority process so the Streamlit app and the scoring
+server keep serving the current model while a new one is trained. Each round
+picks up only the predictions added since the last published model version,
+grows extra trees on them, validates against a holdout and atomically
+replaces models/model.pkl. Serving processes pick the new file up on their
+next get_cached_model call.
+
+Usage:
+    python retrain_model.py --once
+    python retrain_model.py --interval 3600
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+from utils.training import retrain_from_predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally retrain the water quality model")
+    parser.add_argument("--once", action="store_true", help="Run a single retraining round and exit")
+    parser.add_argument("--interval", type=int, default=3600, help="Seconds between rounds")
+    parser.add_argument("--min-new-rows", type=int, default=20, help="Minimum new predictions before retraining")
+    parser.add_argument("--add-trees", type=int, default=10, help="Trees grown per round")
+    parser.add_argument("--max-trees", type=int, default=300, help="Forest size that triggers a full rebuild")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed holdout accuracy drop")
+    parser.add_argument("--nice", type=int, default=10, help="Scheduling priority increment for this process")
+    args = parser.parse_args()
+
+    # Stay out of the way of serving processes on the same host
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+
+    while True:
+        try:
+            message = retrain_from_predictions(args.min_new_rows, args.add_trees, args.max_trees, args.tolerance)
+        except Exception as e:
+            message = f"Retraining failed: {e}"
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Offline scoring of large CSV files of water quality readings.
+
+The input is split into byte ranges that end on line boundaries, each range
+is parsed and scored by a worker process that loads the model once at
+startup, and the results are written to the output file in input order.
+Only a few chunks are in flight at a time, so memory stays bounded by
+--chunk-mb and --workers rather than by the file size. Fields must not
+contain quoted newlines, which holds for numeric sensor exports.
+
+Each output row carries potability, confidence, decided_by and one 0/1
+violation flag per parameter. Samples decided by the labelling rule
+(decided_by=rule) have no model confidence; rows with a missing,
+non-numeric or non-finite parameter are left unscored.
+
+--workers defaults to the number of CPUs (os.cpu_count()). Workers only
+pay off with that many free cores: on a single core one worker scores in
+process, and extra workers add pickling and scheduling overhead.
+
+Usage:
+    python score_file.py readings.csv scored.csv
+    python score_file.py readings.csv scored.csv --workers 8 --chunk-mb 64 --results-only
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS, get_cached_model, score_batch, get_parameter_violations
+
+RESULT_COLUMNS = ['potability', 'confidence', 'decided_by'] + [f"{param}_violation" for param in FEATURE_COLUMNS]
+
+# Set in each worker by init_worker so the model is loaded once per process
+_worker_model = None
+
+
+def init_worker(model_path):
+    global _worker_model
+    _worker_model = get_cached_model(model_path)
+
+
+def read_header(path):
+    """Return the column names and the byte offset where the data starts"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+    return pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist(), len(header)
+
+
+def split_ranges(path, data_start, chunk_bytes):
+    """Yield (start, end) byte ranges of about chunk_bytes that end on a line boundary"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = data_start
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+def score_frame(model, frame, keep_input=True):
+    """Score a frame of readings and return it with the result columns appended"""
+    results = pd.DataFrame(index=frame.index, columns=RESULT_COLUMNS, dtype=object)
+    features = frame[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan)
+    valid = features.notna().all(axis=1)
+    if valid.any():
+        predictions, confidences = score_batch(model, features[valid])
+        results.loc[valid, 'potability'] = predictions
+        results.loc[valid, 'confidence'] = confidences.round(2)
+        results.loc[valid, 'decided_by'] = np.where(np.isnan(confidences), 'rule', 'model')
+        violations = get_parameter_violations(features[valid]).astype(int)
+        results.loc[valid, RESULT_COLUMNS[3:]] = violations.to_numpy()
+    return pd.concat([frame, results], axis=1) if keep_input else results
+
+
+def score_range(path, start, end, columns, keep_input):
+    """Parse one byte range of the input and return (rows, CSV text of the scored rows)
+
+    Fields are read as text so passed-through columns keep their exact input
+    values (IDs like "007" stay "007"); score_frame converts the parameters.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    frame = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=str, keep_default_na=False)
+    scored = score_frame(_worker_model, frame, keep_input)
+    return len(scored), scored.to_csv(header=False, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a large CSV of water quality readings")
+    parser.add_argument("input", help="CSV with a header row and the nine parameter columns")
+    parser.add_argument("output", help="Where to write the scored CSV")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes (default: the number of CPUs)")
+    parser.add_argument("--chunk-mb", type=float, default=32, help="Approximate input size of each chunk")
+    parser.add_argument("--results-only", action="store_true", help="Write only the result columns, not the input columns")
+    parser.add_argument("--model", default="models/model.pkl")
+    args = parser.parse_args()
+
+    columns, data_start = read_header(args.input)
+    missing = [col for col in FEATURE_COLUMNS if col not in columns]
+    if missing:
+        print(f"Error: input is missing columns {', '.join(missing)}")
+        sys.exit(1)
+    keep_input = not args.results_only
+    output_columns = (columns if keep_input else []) + RESULT_COLUMNS
+    ranges = split_ranges(args.input, data_start, max(1, int(args.chunk_mb * 1024 * 1024)))
+
+    start_time = time.perf_counter()
+    total_rows = 0
+    with open(args.output, 'w', newline='') as out:
+        out.write(pd.DataFrame(columns=output_columns).to_csv(index=False))
+        if args.workers <= 1:
+            init_worker(args.model)
+            for start, end in ranges:
+                rows, text = score_range(args.input, start, end, columns, keep_input)
+                out.write(text)
+                total_rows += rows
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.model,)) as pool:
+                # Keep a bounded window of chunks in flight and write them back in submission order
+                pending = deque()
+                for start, end in ranges:
+                    pending.append(pool.submit(score_range, args.input, start, end, columns, keep_input))
+                    if len(pending) >= args.workers * 2:
+                        rows, text = pending.popleft().result()
+                        out.write(text)
+                        total_rows += rows
+                while pending:
+                    rows, text = pending.popleft().result()
+                    out.write(text)
+                    total_rows += rows
+
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Scored {total_rows:,} rows in {elapsed:.2f}s "
+          f"({total_rows / elapsed:,.0f} rows/s with {max(1, args.workers)} workers) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
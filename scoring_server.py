@@ -0,0 +1,274 @@
+"""Standalone HTTP scoring server for sensor gateways.
+
+Endpoints:
+    GET  /health   -> model and server status, with rule fast path counters
+    GET  /regions  -> per-region running statistics and drift flags
+                      (?key=STATE%20/%20Region for a single region)
+    POST /predict  -> score one sample (JSON object) or a batch
+                      (JSON list, or {"samples": [...], "persist": true})
+
+Each sample carries the nine water quality parameters. When the server is
+started with --persist, samples may also carry region, state and user_id and
+are stored through the same storage layer as the Streamlit app. Samples
+decided by the rule fast path come back with decided_by "rule", a null
+confidence and no contributions.
+
+Usage:
+    python scoring_server.py --host 127.0.0.1 --port 8502 [--persist]
+"""
+import argparse
+import json
+import math
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from utils.ml_model import (
+    FEATURE_COLUMNS,
+    get_cached_model,
+    get_scoring_path_stats,
+    make_batch_prediction,
+    get_parameter_analysis,
+    get_parameter_violations,
+    get_feature_contributions,
+    CONTRIBUTION_COLUMNS,
+)
+from utils.data_handler import initialize_data_files, save_predictions
+from utils.region_stats import get_region_stats
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class BadRequest(Exception):
+    """Raised when a request body cannot be scored"""
+
+
+def _persist_flag(payload):
+    """The payload's 'persist' value, which must be a JSON true or false when present"""
+    persist = payload.get('persist', False)
+    if not isinstance(persist, bool):
+        raise BadRequest(f"'persist' must be true or false, not {persist!r}")
+    return persist
+
+
+def parse_samples(payload):
+    """Return (samples, is_batch, persist) from a decoded JSON payload"""
+    persist = False
+    if isinstance(payload, dict) and 'samples' in payload:
+        samples = payload['samples']
+        persist = _persist_flag(payload)
+        is_batch = True
+    elif isinstance(payload, list):
+        samples = payload
+        is_batch = True
+    elif isinstance(payload, dict):
+        samples = [payload]
+        persist = _persist_flag(payload)
+        is_batch = False
+    else:
+        raise BadRequest("Body must be a JSON object or a list of objects")
+
+    if not isinstance(samples, list) or not all(isinstance(s, dict) for s in samples):
+        raise BadRequest("'samples' must be a list of objects")
+
+    for index, sample in enumerate(samples):
+        missing = [col for col in FEATURE_COLUMNS if col not in sample]
+        if missing:
+            raise BadRequest(f"Sample {index} is missing parameters: {', '.join(missing)}")
+        for col in FEATURE_COLUMNS:
+            try:
+                value = float(sample[col])
+            except (TypeError, ValueError):
+                raise BadRequest(f"Sample {index} has a non-numeric {col}: {sample[col]!r}")
+            if not math.isfinite(value):
+                raise BadRequest(f"Sample {index} has a non-finite {col}: {sample[col]!r}")
+    return samples, is_batch, persist
+
+
+def score_samples(model, samples, detail=False):
+    """Score a list of sample dicts and return JSON-ready result dicts"""
+    if not samples:
+        return []
+    try:
+        X = pd.DataFrame(samples)[FEATURE_COLUMNS].astype(float)
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"Parameter values must be numeric: {e}")
+
+    predictions = make_batch_prediction(model, X)
+    # Rule-decided samples have no confidence and are not explained; only model-scored rows get contributions
+    model_rows = [row for row, (_, confidence) in enumerate(predictions) if not math.isnan(confidence)]
+    contribution_records = None
+    if model_rows:
+        _, contributions_df = get_feature_contributions(model, X.iloc[model_rows])
+        if contributions_df is not None:
+            contribution_records = dict(zip(model_rows, contributions_df.round(4).to_dict(orient='records')))
+    violations = get_parameter_violations(X)
+    unsafe_columns = violations.columns.to_numpy()
+    violation_matrix = violations.to_numpy()
+
+    results = []
+    for row, (prediction, confidence) in enumerate(predictions):
+        rule_decided = math.isnan(confidence)
+        result = {
+            'potability': prediction,
+            'label': 'DRINKABLE' if prediction == 1 else 'NOT DRINKABLE',
+            'confidence': None if rule_decided else round(confidence, 2),
+            'decided_by': 'rule' if rule_decided else 'model',
+            'unsafe_parameters': unsafe_columns[violation_matrix[row]].tolist(),
+        }
+        if contribution_records is not None and row in contribution_records:
+            result['contributions'] = contribution_records[row]
+        if detail:
+            sample_data = X.iloc[row].to_dict()
+            result['parameter_analysis'] = get_parameter_analysis(sample_data).to_dict(orient='records')
+        results.append(result)
+    return results
+
+
+def persist_results(samples, results):
+    """Store scored samples through the shared prediction storage layer"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    records = []
+    for sample, result in zip(samples, results):
+        records.append({
+            'user_id': sample.get('user_id', 'gateway'),
+            'region': sample.get('region', 'unknown'),
+            'state': sample.get('state', 'unknown'),
+            'timestamp': sample.get('timestamp', timestamp),
+            'potability': result['potability'],
+            'confidence': result['confidence'],
+            **{col: float(sample[col]) for col in FEATURE_COLUMNS},
+            **{col: result['contributions'][param] for param, col in zip(FEATURE_COLUMNS, CONTRIBUTION_COLUMNS)
+               if 'contributions' in result}
+        })
+    return save_predictions(records)
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Request handler; HTTP/1.1 keeps gateway connections alive between requests"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "WaterQualityScoring/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status >= 400:
+            # The request body may not have been read, so the connection cannot be reused safely
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        if path == "/regions":
+            key = parse_qs(url.query).get('key', [None])[0]
+            stats = get_region_stats(key)
+            if stats is None:
+                self.send_json(404, {'error': f"No statistics for region {key}"})
+            else:
+                self.send_json(200, stats)
+        elif path == "/health":
+            try:
+                model = get_cached_model(self.server.model_path)
+                self.send_json(200, {
+                    'status': 'ok',
+                    'model': type(model).__name__,
+                    'persist': self.server.persist,
+                    'scoring_paths': get_scoring_path_stats(),
+                })
+            except Exception as e:
+                self.send_json(503, {'status': 'unavailable', 'error': str(e)})
+        else:
+            self.send_json(404, {'error': f"Unknown path {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            self.send_json(404, {'error': f"Unknown path {url.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self.send_json(400, {'error': "Invalid Content-Length header"})
+            return
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self.send_json(413 if length > 0 else 400, {'error': "Invalid request body size"})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+            samples, is_batch, persist = parse_samples(payload)
+            detail = parse_qs(url.query).get('detail', ['0'])[0] in ('1', 'true')
+            model = get_cached_model(self.server.model_path)
+            results = score_samples(model, samples, detail=detail)
+        except (BadRequest, json.JSONDecodeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': f"Scoring failed: {e}"})
+            return
+
+        if persist:
+            if not self.server.persist:
+                self.send_json(403, {'error': "Persistence is disabled on this server"})
+                return
+            try:
+                saved = persist_results(samples, results)
+            except Exception as e:
+                print(f"Error saving scored samples: {e}")
+                saved = False
+            if not saved:
+                self.send_json(500, {'error': "Scoring succeeded but saving failed"})
+                return
+
+        self.send_json(200, {'results': results} if is_batch else results[0])
+
+
+def create_server(host="127.0.0.1", port=8502, model_path="models/model.pkl", persist=False, verbose=False):
+    """Create a threaded scoring server that shares one resident model"""
+    server = ThreadingHTTPServer((host, port), ScoringHandler)
+    server.daemon_threads = True
+    server.model_path = model_path
+    server.persist = persist
+    server.verbose = verbose
+    # Load the model up front so the first request does not pay for it
+    get_cached_model(model_path)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Water quality HTTP scoring server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--model", default="models/model.pkl", help="Path to the trained model")
+    parser.add_argument("--persist", action="store_true", help="Allow requests to save predictions")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    if args.persist:
+        initialize_data_files()
+
+    server = create_server(args.host, args.port, args.model, args.persist, args.verbose)
+    print(f"✅ Scoring server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
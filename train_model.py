@@ -2,12 +2,9 @@ import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
-import joblib
 import os
-
-# Load the dataset
-df = pd.read_csv("your_dataset.csv")  # Make sure this CSV exists in the project root
-df.dropna(inplace=True)
+import argparse
+from utils.training import load_registry, publish_model, train_streaming_forest, train_streaming_sgd, evaluate_streaming
 
 # ✅ Recalculate Potability using logical conditions
 def determine_potability(row):
@@ -24,27 +21,71 @@ def determine_potability(row):
 
     return int(safe_conditions >= 7)
 
-df["Potability"] = df.apply(determine_potability, axis=1)
+def train_in_memory(dataset):
+    """Train on the whole dataset loaded into memory"""
+    # Load the dataset
+    df = pd.read_csv(dataset)  # Make sure this CSV exists in the project root
+    df.dropna(inplace=True)
+
+    df["Potability"] = df.apply(determine_potability, axis=1)
+
+    # Split into features and target
+    X = df.drop("Potability", axis=1)
+    y = df["Potability"]
+
+    # Train/test split
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    # Train model
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+
+    # Evaluate model
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"✅ Model trained with accuracy: {accuracy:.2f}")
+    return model, accuracy, len(X_train)
 
-# Split into features and target
-X = df.drop("Potability", axis=1)
-y = df["Potability"]
+def train_out_of_core(args):
+    """Train by streaming the dataset in chunks; memory is bounded by the chunk and sample sizes"""
+    if args.learner == "sgd":
+        model = train_streaming_sgd(args.dataset, args.chunksize, epochs=args.epochs)
+    else:
+        model = train_streaming_forest(
+            args.dataset, args.chunksize, n_estimators=args.n_estimators,
+            rows_per_tree=args.rows_per_tree, max_rows_in_memory=args.max_rows_in_memory
+        )
+    accuracy = evaluate_streaming(model, args.dataset, args.chunksize)
+    print(f"✅ Out-of-core {args.learner} model trained with holdout accuracy: {accuracy:.2f}")
+    return model, accuracy, None
 
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+def main():
+    parser = argparse.ArgumentParser(description="Train the water quality model")
+    parser.add_argument("--dataset", default="your_dataset.csv", help="Training CSV")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the dataset in chunks of this many rows instead of loading it whole")
+    parser.add_argument("--learner", choices=["forest", "sgd"], default="forest",
+                        help="Out-of-core learner: bagged forest on streamed samples or incremental SGD")
+    parser.add_argument("--n-estimators", type=int, default=100, help="Trees in the streamed forest")
+    parser.add_argument("--rows-per-tree", type=int, default=50000, help="Streamed sample size per tree")
+    parser.add_argument("--max-rows-in-memory", type=int, default=1000000,
+                        help="Rows held in tree samples at once; sets peak memory")
+    parser.add_argument("--epochs", type=int, default=5, help="Passes over the data for the SGD learner")
+    args = parser.parse_args()
 
-# Train model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    if args.chunksize:
+        model, accuracy, trained_rows = train_out_of_core(args)
+    else:
+        model, accuracy, trained_rows = train_in_memory(args.dataset)
 
-# Evaluate model
-y_pred = model.predict(X_test)
-accuracy = accuracy_score(y_test, y_pred)
-print(f"✅ Model trained with accuracy: {accuracy:.2f}")
+    # Save the model as a new version; incremental retraining restarts from the full prediction history
+    os.makedirs("models", exist_ok=True)
+    registry = load_registry()
+    registry.update({'last_timestamp': None, 'last_ids': [], 'accuracy': round(accuracy, 4), 'trained_rows': trained_rows})
+    registry = publish_model(model, registry)
+    print(f"✅ Model saved to models/model.pkl (version {registry['version']})")
 
-# Save the model
-os.makedirs("models", exist_ok=True)
-joblib.dump(model, "models/model.pkl")
-print("✅ Model saved to models/model.pkl")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Limits for the interactive prediction path; override with environment variables
+MAX_CONCURRENT = int(os.environ.get('WQ_MAX_CONCURRENT_PREDICTIONS', '4'))
+MAX_QUEUE = int(os.environ.get('WQ_MAX_QUEUED_PREDICTIONS', '16'))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('WQ_PREDICTION_QUEUE_TIMEOUT', '10'))
+USER_RATE_PER_MINUTE = float(os.environ.get('WQ_USER_PREDICTIONS_PER_MINUTE', '10'))
+USER_BURST = int(os.environ.get('WQ_USER_PREDICTION_BURST', '5'))
+# How often buckets that have refilled to a full burst are dropped
+BUCKET_SWEEP_SECONDS = 60.0
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away; reason is 'rate_limited', 'queue_full' or 'timeout'"""
+
+    def __init__(self, reason, message, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, timed wait queue and per-user token buckets"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT_SECONDS,
+                 rate_per_minute=USER_RATE_PER_MINUTE, burst=USER_BURST):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._buckets = {}
+        self._last_sweep = time.monotonic()
+        self._metrics = {
+            'admitted': 0, 'queued': 0, 'rejected_rate_limited': 0, 'rejected_queue_full': 0,
+            'rejected_timeout': 0, 'max_queue_depth': 0, 'total_wait_seconds': 0.0,
+        }
+
+    def _sweep_buckets(self, now):
+        """Forget users whose bucket has refilled to a full burst; a missing bucket starts full anyway"""
+        if now - self._last_sweep < BUCKET_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        self._buckets = {
+            user_id: (tokens, updated) for user_id, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate_per_second < self.burst
+        }
+
+    def _take_token(self, user_id, now):
+        """Consume one token from the user's bucket.
+
+        Returns 0.0 when a token was taken, otherwise the seconds until one is
+        available, or None when the bucket never refills (a rate of 0).
+        """
+        self._sweep_buckets(now)
+        tokens, updated = self._buckets.get(user_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate_per_second)
+        if tokens < 1.0:
+            self._buckets[user_id] = (tokens, now)
+            return (1.0 - tokens) / self.rate_per_second if self.rate_per_second > 0 else None
+        self._buckets[user_id] = (tokens - 1.0, now)
+        return 0.0
+
+    def _refund_token(self, user_id):
+        tokens, updated = self._buckets.get(user_id, (0.0, time.monotonic()))
+        self._buckets[user_id] = (min(float(self.burst), tokens + 1.0), updated)
+
+    def _reject(self, reason, message, retry_after=None):
+        self._metrics[f"rejected_{reason}"] += 1
+        raise AdmissionRejected(reason, message, retry_after)
+
+    @contextmanager
+    def admit(self, user_id):
+        """Hold one execution slot for the duration of the block; yields the seconds spent queued"""
+        start = time.monotonic()
+        with self._condition:
+            wait_needed = self._take_token(user_id, start)
+            if wait_needed is None or wait_needed > 0:
+                self._reject('rate_limited', "You are submitting samples too quickly.", wait_needed)
+
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._refund_token(user_id)
+                    self._reject('queue_full', "The system is at capacity.", self.queue_timeout)
+                self._waiting += 1
+                self._metrics['queued'] += 1
+                self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], self._waiting)
+                deadline = start + self.queue_timeout
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._refund_token(user_id)
+                            self._reject('timeout', "Timed out waiting for a free slot.", self.queue_timeout)
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._active += 1
+            waited = time.monotonic() - start
+            self._metrics['admitted'] += 1
+            self._metrics['total_wait_seconds'] += waited
+        try:
+            yield waited
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def is_busy(self):
+        """True when a new request would have to queue"""
+        with self._condition:
+            return self._active >= self.max_concurrent
+
+    def get_metrics(self):
+        """Current load plus cumulative admission counters"""
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics.update({
+                'active': self._active,
+                'queue_depth': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'avg_wait_seconds': metrics['total_wait_seconds'] / metrics['admitted'] if metrics['admitted'] else 0.0,
+            })
+            return metrics
+
+
+# One controller per server process, shared by every session
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+import threading
+
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS
+from utils.region_stats import region_key
+from utils.sketches import HyperLogLog, KLLSketch, CountMinSketch
+
+# Opt-in: WQ_APPROX_ANALYTICS=1 maintains per-day, per-region sketches on every write
+APPROX_ENABLED = os.environ.get('WQ_APPROX_ANALYTICS', '0') not in ('', '0', 'false')
+SKETCH_DIR = 'data/sketches'
+QUANTILE_COLUMNS = FEATURE_COLUMNS + ['confidence']
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Parsed day files, keyed by path and reused while the file's mtime and size are unchanged
+_day_cache = {}
+_summary_cache = {}
+_cache_lock = threading.Lock()
+
+def _new_entry():
+    return {
+        'count': 0, 'drinkable': 0, 'confidence_sum': 0.0, 'confidence_count': 0,
+        'users': HyperLogLog(),
+        'quantiles': {col: KLLSketch() for col in QUANTILE_COLUMNS},
+    }
+
+def _entry_to_dict(entry):
+    return {
+        'count': entry['count'], 'drinkable': entry['drinkable'], 'confidence_sum': entry['confidence_sum'],
+        'confidence_count': entry['confidence_count'],
+        'users': entry['users'].to_dict(),
+        'quantiles': {col: sketch.to_dict() for col, sketch in entry['quantiles'].items()},
+    }
+
+def _entry_from_dict(data):
+    return {
+        'count': data['count'], 'drinkable': data['drinkable'], 'confidence_sum': data['confidence_sum'],
+        # Sketches written before rule-decided samples existed had a confidence for every sample
+        'confidence_count': data.get('confidence_count', data['count']),
+        'users': HyperLogLog.from_dict(data['users']),
+        'quantiles': {col: KLLSketch.from_dict(sketch) for col, sketch in data['quantiles'].items()},
+    }
+
+def _day_path(day):
+    return os.path.join(SKETCH_DIR, f"day_{day}.json")
+
+def _stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _load_day(day):
+    """Return the raw sketch document for one day (regions and contributor counts)"""
+    path = _day_path(day)
+    try:
+        stamp = _stamp(path)
+    except FileNotFoundError:
+        return {'regions': {}, 'contributors': None}
+    with _cache_lock:
+        cached = _day_cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    with open(path) as f:
+        document = json.load(f)
+    with _cache_lock:
+        _day_cache[path] = (stamp, document)
+    return document
+
+def _save_day(day, document):
+    os.makedirs(SKETCH_DIR, exist_ok=True)
+    path = _day_path(day)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f)
+    os.replace(tmp_path, path)
+
+def update_sketches(records):
+    """Fold prediction records into the day/region sketches; callers serialize writers"""
+    records_df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    if records_df.empty:
+        return
+    records_df = records_df.assign(
+        day=records_df['timestamp'].astype(str).str[:10],
+        key=[region_key(state, region) for state, region in
+             zip(records_df['state'].astype(object).fillna('unknown'), records_df['region'].astype(object).fillna('unknown'))],
+    )
+    for day, day_df in records_df.groupby('day'):
+        document = _load_day(day)
+        # Only the regions in this batch are decoded; the rest are written back as stored
+        regions = dict(document['regions'])
+        contributors = CountMinSketch.from_dict(document['contributors']) if document['contributors'] else CountMinSketch()
+        for key, region_df in day_df.groupby('key'):
+            entry = _entry_from_dict(regions[key]) if key in regions else _new_entry()
+            entry['count'] += len(region_df)
+            entry['drinkable'] += int((region_df['potability'] == 1).sum())
+            entry['confidence_sum'] += float(region_df['confidence'].sum())
+            entry['confidence_count'] += int(region_df['confidence'].notna().sum())
+            entry['users'].update(region_df['user_id'])
+            for col in QUANTILE_COLUMNS:
+                entry['quantiles'][col].update(region_df[col])
+            regions[key] = _entry_to_dict(entry)
+        contributors.update(day_df['user_id'])
+        _save_day(day, {'regions': regions, 'contributors': contributors.to_dict()})
+
+def rebuild_sketches(predictions_df):
+    """Recreate every day's sketches from a full set of predictions"""
+    shutil.rmtree(SKETCH_DIR, ignore_errors=True)
+    with _cache_lock:
+        _day_cache.clear()
+        _summary_cache.clear()
+    os.makedirs(SKETCH_DIR, exist_ok=True)
+    if not predictions_df.empty:
+        update_sketches(predictions_df.dropna(subset=['timestamp']))
+
+def _matches(key, states, regions):
+    state, region = key.split(' / ', 1)
+    if states and state not in {str(s).strip().upper() for s in states}:
+        return False
+    if regions and region not in {str(r).strip().title() for r in regions}:
+        return False
+    return True
+
+def get_approximate_summary(date_from=None, date_to=None, states=None, regions=None):
+    """Merge the day/region sketches in range into approximate totals, distinct users, quantiles and top contributors.
+
+    The cost depends on the number of days and regions covered, not on the
+    number of stored predictions. Returns None when no sketches exist.
+    """
+    if not os.path.isdir(SKETCH_DIR):
+        return None
+    days = sorted(name[4:14] for name in os.listdir(SKETCH_DIR) if name.startswith('day_') and name.endswith('.json'))
+    days = [day for day in days if (not date_from or day >= str(date_from)) and (not date_to or day <= str(date_to))]
+    stamps = tuple((day, _stamp(_day_path(day))) for day in days)
+    cache_key = (stamps, tuple(states or []), tuple(regions or []))
+    with _cache_lock:
+        if cache_key in _summary_cache:
+            return _summary_cache[cache_key]
+
+    merged = _new_entry()
+    region_counts = {}
+    contributors = None
+    for day in days:
+        document = _load_day(day)
+        for key, data in document['regions'].items():
+            if not _matches(key, states, regions):
+                continue
+            entry = _entry_from_dict(data)
+            merged['count'] += entry['count']
+            merged['drinkable'] += entry['drinkable']
+            merged['confidence_sum'] += entry['confidence_sum']
+            merged['confidence_count'] += entry['confidence_count']
+            merged['users'].merge(entry['users'])
+            for col in QUANTILE_COLUMNS:
+                merged['quantiles'][col].merge(entry['quantiles'][col])
+            region_counts[key] = region_counts.get(key, 0) + entry['count']
+        if document['contributors']:
+            day_contributors = CountMinSketch.from_dict(document['contributors'])
+            contributors = day_contributors if contributors is None else contributors.merge(day_contributors)
+
+    quantiles = pd.DataFrame(
+        [merged['quantiles'][col].quantiles(QUANTILES) for col in QUANTILE_COLUMNS],
+        index=QUANTILE_COLUMNS, columns=[f"p{int(q * 100)}" for q in QUANTILES]
+    ).round(2)
+    summary = {
+        'days': len(days),
+        'count': merged['count'],
+        'drinkable': merged['drinkable'],
+        'avg_confidence': merged['confidence_sum'] / merged['confidence_count'] if merged['confidence_count'] else 0.0,
+        'distinct_users': int(round(merged['users'].count())) if merged['count'] else 0,
+        'distinct_users_error': merged['users'].relative_error(),
+        'quantiles': quantiles,
+        'quantile_rank_error': KLLSketch().rank_error(),
+        'region_counts': dict(sorted(region_counts.items(), key=lambda item: -item[1])),
+        'top_contributors': contributors.top(10) if contributors else [],
+        'contributor_error': contributors.error_bound() if contributors else 0.0,
+    }
+    with _cache_lock:
+        if len(_summary_cache) > 32:
+            _summary_cache.clear()
+        _summary_cache[cache_key] = summary
+    return summary
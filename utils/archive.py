@@ -0,0 +1,141 @@
+import json
+import os
+
+import pandas as pd
+
+from utils.shared_cache import compute_aggregates, merge_aggregates
+
+ARCHIVE_DIR = 'data/archive'
+MANIFEST_PATH = os.path.join(ARCHIVE_DIR, 'manifest.json')
+
+_user_cache = {}
+
+def load_manifest():
+    """Return the archive manifest, an empty one when nothing has been archived yet"""
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'segments': []}
+
+def _save_manifest(manifest):
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def _sidecar_path(segment, kind):
+    """Path of a segment's id list ('ids' for prediction ids, 'users' for user ids)"""
+    return segment['path'].replace('.csv.gz', f".{kind}.json")
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_sidecar(segment, kind):
+    # Manifests written before the sidecars existed keep the lists inline
+    inline_key = 'prediction_ids' if kind == 'ids' else 'user_ids'
+    if inline_key in segment:
+        return segment[inline_key]
+    try:
+        with open(_sidecar_path(segment, kind)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Error reading archive id list for segment {segment['number']}: {e}")
+        return None
+
+def _segment_users(segment):
+    """User ids in a segment; segments are immutable, so the list is cached per segment"""
+    users = _user_cache.get(segment['path'])
+    if users is None:
+        users = _read_sidecar(segment, 'users')
+        if users is None:
+            return None
+        users = _user_cache[segment['path']] = set(users)
+    return users
+
+def get_archived_ids(first_timestamp=None, last_timestamp=None):
+    """Set of prediction ids already archived, reading only segments whose time range overlaps the given one"""
+    archived = set()
+    for segment in load_manifest()['segments']:
+        if first_timestamp is not None and segment['last_timestamp'] < first_timestamp:
+            continue
+        if last_timestamp is not None and segment['first_timestamp'] > last_timestamp:
+            continue
+        archived.update(_read_sidecar(segment, 'ids') or [])
+    return archived
+
+def write_segment(predictions_df):
+    """Write predictions to a new immutable gzip segment and record its counts, time range and aggregates in the manifest.
+
+    Prediction and user ids go to small sidecar files next to the segment so
+    the manifest stays the same size per segment however many rows it holds.
+    """
+    from utils.data_handler import store_write_lock
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with store_write_lock('archive'):
+        manifest = load_manifest()
+        number = max((segment['number'] for segment in manifest['segments']), default=0) + 1
+        timestamps = predictions_df['timestamp'].astype(str)
+        path = os.path.join(ARCHIVE_DIR, f"segment_{number:05d}.csv.gz")
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        predictions_df.to_csv(tmp_path, index=False, compression='gzip')
+        os.replace(tmp_path, path)
+
+        segment = {
+            'number': number,
+            'path': path,
+            'rows': int(len(predictions_df)),
+            'users': int(predictions_df['user_id'].nunique()),
+            'first_timestamp': timestamps.min(),
+            'last_timestamp': timestamps.max(),
+            'aggregates': compute_aggregates(predictions_df),
+        }
+        _write_json(_sidecar_path(segment, 'ids'), predictions_df['prediction_id'].astype(str).tolist())
+        _write_json(_sidecar_path(segment, 'users'), sorted(predictions_df['user_id'].dropna().astype(str).unique().tolist()))
+        manifest['segments'].append(segment)
+        # The manifest is the commit point; a segment file it does not list is ignored
+        _save_manifest(manifest)
+    return segment
+
+def load_archived_predictions(user_id=None):
+    """Read archived predictions, opening only the segments that can hold the given user"""
+    frames = []
+    for segment in load_manifest()['segments']:
+        if user_id is not None:
+            users = _segment_users(segment)
+            if users is not None and str(user_id) not in users:
+                continue
+        try:
+            segment_df = pd.read_csv(segment['path'])
+        except Exception as e:
+            print(f"Error reading archive segment {segment['path']}: {e}")
+            continue
+        if user_id is not None:
+            segment_df = segment_df[segment_df['user_id'] == user_id]
+        frames.append(segment_df)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def get_archive_aggregates():
+    """Aggregates over every archived prediction, merged from the per-segment figures in the manifest"""
+    return merge_aggregates([segment['aggregates'] for segment in load_manifest()['segments']])
+
+def get_archive_summary():
+    """One row per archive segment with its date range and stored aggregates"""
+    rows = []
+    for segment in load_manifest()['segments']:
+        aggregates = segment['aggregates']
+        rows.append({
+            'segment': segment['number'],
+            'rows': segment['rows'],
+            'first_timestamp': segment['first_timestamp'],
+            'last_timestamp': segment['last_timestamp'],
+            'drinkable_count': aggregates['drinkable_count'],
+            'avg_confidence': round(aggregates['avg_confidence'], 2),
+        })
+    return pd.DataFrame(rows)
@@ -1,8 +1,13 @@
 import pandas as pd
 import hashlib
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import os
+from utils.data_handler import write_csv_atomic, store_write_lock, bump_data_version
+
+# Rosters smaller than this are hashed inline; pool start-up costs more than it saves
+PARALLEL_HASH_THRESHOLD = 5000
 
 def hash_password(password):
     """Hash password using SHA-256"""
@@ -30,6 +35,10 @@ def authenticate_user(username, password):
 
 def register_user(username, email, password):
     """Register a new user"""
+    with store_write_lock('users'):
+        return _register_user(username, email, password)
+
+def _register_user(username, email, password):
     try:
         # Check if users file exists
         if os.path.exists('data/users.csv'):
@@ -66,13 +75,96 @@ def register_user(username, email, password):
         users_df = pd.concat([users_df, new_user_df], ignore_index=True)
         
         # Save to file
-        users_df.to_csv('data/users.csv', index=False)
+        write_csv_atomic(users_df, 'data/users.csv')
+        bump_data_version('users')
         
         return True, "Registration successful!"
         
     except Exception as e:
         return False, f"Registration failed: {str(e)}"
 
+def _empty_users_df():
+    return pd.DataFrame({
+        'user_id': pd.Series(dtype='str'),
+        'username': pd.Series(dtype='str'),
+        'email': pd.Series(dtype='str'),
+        'password_hash': pd.Series(dtype='str'),
+        'registration_date': pd.Series(dtype='str')
+    })
+
+def hash_passwords(passwords, max_workers=None):
+    """Hash many passwords, spreading large rosters over a process pool"""
+    passwords = list(passwords)
+    if len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [hash_password(password) for password in passwords]
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(hash_password, passwords, chunksize=chunksize))
+
+def bulk_register_users(roster, min_password_length=6):
+    """Validate and register a roster of users with a single write.
+
+    roster is a DataFrame (or list of dicts) with username, email and password
+    columns. Returns (created_count, rejections) where rejections is a list of
+    {'row', 'username', 'reason'} dicts for rows that were not created.
+    """
+    roster = roster if isinstance(roster, pd.DataFrame) else pd.DataFrame(list(roster))
+    missing = {'username', 'email', 'password'} - set(roster.columns)
+    if missing:
+        return 0, [{'row': None, 'username': None, 'reason': f"Missing columns: {', '.join(sorted(missing))}"}]
+
+    roster = roster[['username', 'email', 'password']].fillna('').astype(str)
+    roster['username'] = roster['username'].str.strip()
+    roster['email'] = roster['email'].str.strip()
+
+    with store_write_lock('users'):
+        try:
+            users_df = pd.read_csv('data/users.csv') if os.path.exists('data/users.csv') else _empty_users_df()
+        except Exception as e:
+            return 0, [{'row': None, 'username': None, 'reason': f"Could not read users: {e}"}]
+
+        # Set-based uniqueness against existing accounts and earlier rows of the roster
+        taken_usernames = set(users_df['username'].astype(str))
+        taken_emails = set(users_df['email'].astype(str))
+        accepted, rejections = [], []
+        for row, (username, email, password) in enumerate(roster.itertuples(index=False, name=None), start=1):
+            if not username or not email or not password:
+                reason = "Username, email and password are required"
+            elif len(password) < min_password_length:
+                reason = f"Password must be at least {min_password_length} characters long"
+            elif username in taken_usernames:
+                reason = "Username already exists"
+            elif email in taken_emails:
+                reason = "Email already registered"
+            else:
+                taken_usernames.add(username)
+                taken_emails.add(email)
+                accepted.append((username, email, password))
+                continue
+            rejections.append({'row': row, 'username': username, 'reason': reason})
+
+        if not accepted:
+            return 0, rejections
+
+        registration_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        new_users_df = pd.DataFrame({
+            'user_id': [str(uuid.uuid4()) for _ in accepted],
+            'username': [username for username, _, _ in accepted],
+            'email': [email for _, email, _ in accepted],
+            'password_hash': hash_passwords(password for _, _, password in accepted),
+            'registration_date': registration_date
+        })
+
+        try:
+            users_df = pd.concat([users_df, new_users_df], ignore_index=True) if not users_df.empty else new_users_df
+            write_csv_atomic(users_df, 'data/users.csv')
+            bump_data_version('users')
+        except Exception as e:
+            return 0, rejections + [{'row': None, 'username': None, 'reason': f"Saving failed: {e}"}]
+
+        return len(new_users_df), rejections
+
 def is_admin(username):
     """Check if user is admin"""
     return username == "Admin"
@@ -1,6 +1,136 @@
 import pandas as pd
 import os
-from datetime import datetime
+import glob
+import json
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from utils.archive import write_segment, get_archived_ids, load_archived_predictions, get_archive_aggregates
+from utils.region_stats import STATS_DIR, update_region_stats, rebuild_region_stats
+from utils.approx_analytics import APPROX_ENABLED, SKETCH_DIR, update_sketches, rebuild_sketches
+from utils.shared_cache import get_predictions_snapshot, compute_aggregates, merge_aggregates
+from utils.ml_model import CONTRIBUTION_COLUMNS
+from utils.memory_profiler import profile_memory
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+TABLE_PATHS = {'users': 'data/users.csv', 'predictions': 'data/predictions.csv'}
+VERSION_PATH = 'data/version.json'
+
+# Optional sharded layout: WQ_PREDICTION_SHARDS=K stores predictions in K files keyed by a hash of user_id
+PREDICTION_SHARDS = int(os.environ.get('WQ_PREDICTION_SHARDS', '0') or 0)
+SHARD_DIR = 'data/predictions'
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_lock_state = threading.local()
+
+@contextmanager
+def store_write_lock(name):
+    """Serialize read-modify-write cycles on one data file ('users', 'predictions', a shard) across threads and processes"""
+    held = getattr(_lock_state, 'held', None)
+    if held is None:
+        held = _lock_state.held = set()
+    if name in held:
+        # Already held by this thread
+        yield
+        return
+
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(name, threading.Lock())
+    with thread_lock:
+        os.makedirs('data', exist_ok=True)
+        with open(f"data/.{name}.lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held.add(name)
+            try:
+                yield
+            finally:
+                held.discard(name)
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_shard_paths():
+    """Paths of the prediction shard files for the configured shard count"""
+    return [os.path.join(SHARD_DIR, f"shard_{index:02d}.csv") for index in range(PREDICTION_SHARDS)]
+
+def shard_for_user(user_id):
+    """Shard index holding a user's predictions; crc32 keeps it stable across processes"""
+    return zlib.crc32(str(user_id).encode()) % PREDICTION_SHARDS
+
+def _prediction_paths():
+    return get_shard_paths() if PREDICTION_SHARDS else [TABLE_PATHS['predictions']]
+
+def _lock_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return None
+
+def _read_version_state():
+    try:
+        with open(VERSION_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'version': 0, 'tables': {}}
+
+def _table_stamp(table):
+    if table == 'predictions':
+        return [_file_stamp(path) for path in _prediction_paths()]
+    return _file_stamp(TABLE_PATHS[table])
+
+def _stale_tables(state):
+    """Tables whose files no longer match the stamp recorded with their version"""
+    return [table for table in TABLE_PATHS
+            if state['tables'].get(table, {}).get('stamp') != _table_stamp(table)]
+
+def bump_data_version(*tables):
+    """Record a committed write to the given tables; call after the write has been renamed into place"""
+    with store_write_lock('version'):
+        state = _read_version_state()
+        state['version'] += 1
+        for table in tables:
+            state['tables'][table] = {'version': state['version'], 'stamp': _table_stamp(table)}
+        tmp_path = f"{VERSION_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, VERSION_PATH)
+        return state['version']
+
+def get_data_version(table=None):
+    """Monotonically increasing version of the stored data, or of one table ('users' or 'predictions')"""
+    state = _read_version_state()
+    if _stale_tables(state):
+        # A file was replaced outside this module (restored backup, manual edit); give it a new version
+        with store_write_lock('version'):
+            state = _read_version_state()
+            stale = _stale_tables(state)
+            if stale:
+                bump_data_version(*stale)
+                state = _read_version_state()
+    if table is None:
+        return state['version']
+    return state['tables'][table]['version']
+
+def write_csv_atomic(dataframe, path):
+    """Write a CSV through a temporary file in the same directory and rename it into place"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        dataframe.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 def initialize_data_files():
     """Initialize data files if they don't exist"""
@@ -8,6 +138,26 @@ def initialize_data_files():
     os.makedirs('data', exist_ok=True)
     os.makedirs('models', exist_ok=True)
     
+    # Create missing tables under the write lock so concurrent starts do not race
+    with store_write_lock('users'), store_write_lock('predictions'):
+        _create_missing_tables()
+        if PREDICTION_SHARDS:
+            _prepare_shards()
+        else:
+            _merge_shards()
+    
+    # Backfill per-region running statistics for existing stores
+    if not os.path.isdir(STATS_DIR):
+        rebuild_region_stats(read_prediction_store())
+    
+    # Backfill approximate-analytics sketches over the whole history, archive included
+    if APPROX_ENABLED and not os.path.isdir(SKETCH_DIR):
+        with store_write_lock('sketches'):
+            if not os.path.isdir(SKETCH_DIR):
+                history_df = pd.concat([read_prediction_store(), load_archived_predictions()], ignore_index=True)
+                rebuild_sketches(history_df)
+
+def _create_missing_tables():
     # Initialize users.csv
     if not os.path.exists('data/users.csv'):
         users_df = pd.DataFrame({
@@ -17,59 +167,208 @@ def initialize_data_files():
             'password_hash': pd.Series(dtype='str'),
             'registration_date': pd.Series(dtype='str')
         })
-        users_df.to_csv('data/users.csv', index=False)
+        write_csv_atomic(users_df, 'data/users.csv')
+        bump_data_version('users')
     
     # Initialize predictions.csv
     if not os.path.exists('data/predictions.csv'):
-        predictions_df = pd.DataFrame({
-            'prediction_id': pd.Series(dtype='str'),
-            'user_id': pd.Series(dtype='str'),
-            'region': pd.Series(dtype='str'),
-            'state': pd.Series(dtype='str'),
-            'timestamp': pd.Series(dtype='str'),
-            'potability': pd.Series(dtype='int'),
-            'confidence': pd.Series(dtype='float'),
-            'pH': pd.Series(dtype='float'),
-            'Solids': pd.Series(dtype='float'),
-            'Sulfate': pd.Series(dtype='float'),
-            'Organic_carbon': pd.Series(dtype='float'),
-            'Turbidity': pd.Series(dtype='float'),
-            'Hardness': pd.Series(dtype='float'),
-            'Chloramines': pd.Series(dtype='float'),
-            'Conductivity': pd.Series(dtype='float'),
-            'Trihalomethanes': pd.Series(dtype='float')
-        })
-        predictions_df.to_csv('data/predictions.csv', index=False)
+        write_csv_atomic(_empty_predictions_df(), 'data/predictions.csv')
+        bump_data_version('predictions')
+
+def _empty_predictions_df():
+    return pd.DataFrame({
+        'prediction_id': pd.Series(dtype='str'),
+        'user_id': pd.Series(dtype='str'),
+        'region': pd.Series(dtype='str'),
+        'state': pd.Series(dtype='str'),
+        'timestamp': pd.Series(dtype='str'),
+        'potability': pd.Series(dtype='int'),
+        'confidence': pd.Series(dtype='float'),
+        'pH': pd.Series(dtype='float'),
+        'Solids': pd.Series(dtype='float'),
+        'Sulfate': pd.Series(dtype='float'),
+        'Organic_carbon': pd.Series(dtype='float'),
+        'Turbidity': pd.Series(dtype='float'),
+        'Hardness': pd.Series(dtype='float'),
+        'Chloramines': pd.Series(dtype='float'),
+        'Conductivity': pd.Series(dtype='float'),
+        'Trihalomethanes': pd.Series(dtype='float'),
+        **{col: pd.Series(dtype='float') for col in CONTRIBUTION_COLUMNS}
+    })
+
+def _prepare_shards():
+    """Create the shard files, distributing existing predictions when the layout is new or the shard count changed.
+
+    Rows from data/predictions.csv are copied in the first time; the file
+    itself is left in place as a backup of the unsharded store until
+    sharding is turned off, when _merge_shards folds the shards back in.
+    """
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    shard_paths = get_shard_paths()
+    existing = sorted(glob.glob(os.path.join(SHARD_DIR, 'shard_*.csv')))
+    if existing == shard_paths:
+        return
+
+    sources = existing if existing else [TABLE_PATHS['predictions']]
+    frames = [pd.read_csv(path) for path in sources if os.path.exists(path)]
+    predictions_df = pd.concat(frames, ignore_index=True) if frames else _empty_predictions_df()
+    shard_index = predictions_df['user_id'].map(shard_for_user) if not predictions_df.empty else pd.Series(dtype=int)
+    for index, path in enumerate(shard_paths):
+        shard_df = predictions_df[shard_index == index] if not predictions_df.empty else _empty_predictions_df()
+        write_csv_atomic(shard_df, path)
+    for path in set(existing) - set(shard_paths):
+        os.remove(path)
+    bump_data_version('predictions')
+
+def _merge_shards():
+    """Fold shard files left by an earlier sharded run back into data/predictions.csv and remove them.
+
+    The shards hold every row since sharding was turned on; predictions.csv
+    is only the backup taken at that point, so it is replaced.
+    """
+    existing = sorted(glob.glob(os.path.join(SHARD_DIR, 'shard_*.csv')))
+    if not existing:
+        return
+    frames = [frame for frame in (pd.read_csv(path) for path in existing) if not frame.empty]
+    predictions_df = pd.concat(frames, ignore_index=True) if frames else _empty_predictions_df()
+    if not predictions_df.empty:
+        predictions_df = predictions_df.sort_values('timestamp', kind='stable')
+    write_csv_atomic(predictions_df, TABLE_PATHS['predictions'])
+    for path in existing:
+        os.remove(path)
+    bump_data_version('predictions')
+
+def _read_shard(path):
+    try:
+        return pd.read_csv(path)
+    except FileNotFoundError:
+        return _empty_predictions_df()
+
+def read_prediction_store():
+    """Read every prediction row, fanning out over the shards in a thread pool when the store is sharded"""
+    paths = _prediction_paths()
+    if len(paths) == 1:
+        return pd.read_csv(paths[0])
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        frames = [frame for frame in executor.map(_read_shard, paths) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else _empty_predictions_df()
 
 def save_prediction(prediction_data):
     """Save a new prediction to the database"""
-    try:
+    return save_predictions([prediction_data])
+
+def _append_predictions(path, predictions, id_prefix=''):
+    """Append predictions to one store file with an atomic rewrite under that file's lock"""
+    with store_write_lock(_lock_name(path)):
         # Load existing predictions
-        predictions_df = pd.read_csv('data/predictions.csv')
+        predictions_df = _read_shard(path)
         
-        # Add prediction ID
-        prediction_data['prediction_id'] = f"pred_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(predictions_df)}"
+        # Add prediction IDs
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        for offset, prediction_data in enumerate(predictions):
+            prediction_data['prediction_id'] = f"pred_{timestamp}_{id_prefix}{len(predictions_df) + offset}"
         
-        # Create new prediction dataframe
-        new_prediction_df = pd.DataFrame([prediction_data])
+        # Create new predictions dataframe
+        new_predictions_df = pd.DataFrame(list(predictions))
         
-        # Concatenate and save
+        # Concatenate and save; readers see either the old file or the new one, never a partial write
         if not predictions_df.empty:
-            predictions_df = pd.concat([predictions_df, new_prediction_df], ignore_index=True)
+            predictions_df = pd.concat([predictions_df, new_predictions_df], ignore_index=True)
         else:
-            predictions_df = new_prediction_df
-        predictions_df.to_csv('data/predictions.csv', index=False)
-        
-        return True
+            predictions_df = new_predictions_df
+        write_csv_atomic(predictions_df, path)
+
+def save_predictions(predictions):
+    """Save a batch of predictions to the database with a single write per store file"""
+    try:
+        if PREDICTION_SHARDS:
+            # Only the shards these users hash to are locked, so other users keep writing in parallel
+            by_shard = {}
+            for prediction_data in predictions:
+                by_shard.setdefault(shard_for_user(prediction_data.get('user_id')), []).append(prediction_data)
+            shard_paths = get_shard_paths()
+            for index, shard_predictions in by_shard.items():
+                _append_predictions(shard_paths[index], shard_predictions, id_prefix=f"s{index}_")
+        else:
+            _append_predictions(TABLE_PATHS['predictions'], predictions)
+        bump_data_version('predictions')
     except Exception as e:
         print(f"Error saving prediction: {e}")
         return False
+    
+    # Update per-region drift statistics; the prediction is already stored if this fails
+    try:
+        update_region_stats(predictions)
+    except Exception as e:
+        print(f"Error updating region statistics: {e}")
+    
+    if APPROX_ENABLED:
+        try:
+            with store_write_lock('sketches'):
+                update_sketches(predictions)
+        except Exception as e:
+            print(f"Error updating analytics sketches: {e}")
+    return True
 
-def get_user_predictions(user_id):
+def compact_predictions(max_age_days=90, now=None):
+    """Move predictions older than max_age_days into an archive segment and shrink the hot store.
+
+    Returns the number of predictions archived.
+    """
+    cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    archived = 0
+    for path in _prediction_paths():
+        with store_write_lock(_lock_name(path)):
+            predictions_df = _read_shard(path)
+            timestamps = predictions_df['timestamp'].astype(str)
+            expired = timestamps < cutoff
+            if not expired.any():
+                continue
+
+            # Rows a previous interrupted run already archived are only dropped from the hot store
+            archived_ids = get_archived_ids(timestamps[expired].min(), timestamps[expired].max())
+            to_archive = predictions_df[expired & ~predictions_df['prediction_id'].isin(archived_ids)]
+            if not to_archive.empty:
+                write_segment(to_archive)
+                archived += len(to_archive)
+
+            write_csv_atomic(predictions_df[~expired], path)
+        bump_data_version('predictions')
+    return archived
+
+def _load_predictions():
+    """Load the prediction store and its aggregates, through the cross-process snapshot cache when possible"""
+    try:
+        return get_predictions_snapshot(TABLE_PATHS['predictions'], get_data_version('predictions'),
+                                        reader=read_prediction_store)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        print(f"Prediction cache unavailable, reading store directly: {e}")
+        predictions_df = read_prediction_store()
+        return predictions_df, compute_aggregates(predictions_df)
+
+def _with_archive(predictions_df, user_id=None):
+    """Append archived predictions, skipping any still present in the hot store"""
+    archived_df = load_archived_predictions(user_id)
+    if archived_df.empty:
+        return predictions_df
+    if not predictions_df.empty:
+        archived_df = archived_df[~archived_df['prediction_id'].isin(predictions_df['prediction_id'])]
+    return pd.concat([predictions_df, archived_df], ignore_index=True)
+
+@profile_memory()
+def get_user_predictions(user_id, include_archive=False):
     """Get all predictions for a specific user"""
     try:
-        predictions_df = pd.read_csv('data/predictions.csv')
+        if PREDICTION_SHARDS:
+            # All of a user's predictions live in one shard
+            predictions_df = _read_shard(get_shard_paths()[shard_for_user(user_id)])
+        else:
+            predictions_df, _ = _load_predictions()
         user_predictions = predictions_df[predictions_df['user_id'] == user_id]
+        if include_archive:
+            user_predictions = _with_archive(user_predictions, user_id)
         if not user_predictions.empty:
             return user_predictions.sort_values('timestamp', ascending=False)
         else:
@@ -80,6 +379,7 @@ def get_user_predictions(user_id):
         print(f"Error loading user predictions: {e}")
         return pd.DataFrame()
 
+@profile_memory()
 def get_all_users():
     """Get all users data"""
     try:
@@ -91,10 +391,13 @@ def get_all_users():
         print(f"Error loading users data: {e}")
         return pd.DataFrame()
 
-def get_all_predictions():
+@profile_memory()
+def get_all_predictions(include_archive=False):
     """Get all predictions data"""
     try:
-        predictions_df = pd.read_csv('data/predictions.csv')
+        predictions_df, _ = _load_predictions()
+        if include_archive:
+            predictions_df = _with_archive(predictions_df)
         return predictions_df
     except FileNotFoundError:
         return pd.DataFrame()
@@ -102,6 +405,22 @@ def get_all_predictions():
         print(f"Error loading predictions data: {e}")
         return pd.DataFrame()
 
+@profile_memory()
+def get_prediction_aggregates(include_archive=False):
+    """Get precomputed totals, regional counts, violations and parameter means for all predictions"""
+    try:
+        _, aggregates = _load_predictions()
+        if include_archive:
+            # Archived segments keep their aggregates in the manifest, so no segment is read
+            aggregates = merge_aggregates([aggregates, get_archive_aggregates()])
+        return aggregates
+    except FileNotFoundError:
+        return compute_aggregates(pd.DataFrame())
+    except Exception as e:
+        print(f"Error loading prediction aggregates: {e}")
+        return compute_aggregates(pd.DataFrame())
+
+@profile_memory()
 def export_data_csv(dataframe):
     """Export dataframe to CSV format for download"""
     return dataframe.to_csv(index=False)
@@ -0,0 +1,129 @@
+import functools
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Set WQ_MEMORY_PROFILE=1 to trace allocations in the app; tracing slows Python down, so it is off by default
+PROFILE_ENABLED = os.environ.get('WQ_MEMORY_PROFILE', '0') not in ('', '0', 'false')
+TRACE_FRAMES = 1
+
+# Budgets in MB; 0 disables a check
+RERUN_PEAK_BUDGET_MB = float(os.environ.get('WQ_MEMORY_RERUN_BUDGET_MB', '0') or 0)
+SESSION_RETAINED_BUDGET_MB = float(os.environ.get('WQ_MEMORY_SESSION_BUDGET_MB', '0') or 0)
+
+MB = 1024 * 1024
+
+_stats = {}
+_stats_lock = threading.Lock()
+_frames = threading.local()
+
+def start_profiling(frames=TRACE_FRAMES):
+    """Start tracing allocations if it is not running yet"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+def is_profiling():
+    return tracemalloc.is_tracing()
+
+def _record(label, peak, retained):
+    with _stats_lock:
+        entry = _stats.setdefault(label, {'calls': 0, 'peak_max': 0, 'peak_last': 0, 'retained_total': 0, 'retained_last': 0})
+        entry['calls'] += 1
+        entry['peak_max'] = max(entry['peak_max'], peak)
+        entry['peak_last'] = peak
+        entry['retained_total'] += retained
+        entry['retained_last'] = retained
+
+@contextmanager
+def track_memory(label, result=None):
+    """Measure the peak and retained allocations of a block while tracemalloc is tracing.
+
+    Peaks are measured relative to the memory in use when the block starts.
+    Nested blocks are supported: each reports its own peak and the enclosing
+    block still sees the highest point reached inside it. When result is a
+    dict it receives 'peak' and 'retained' in bytes. tracemalloc counts the
+    whole process, so concurrent sessions show up in each other's figures.
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+
+    stack = getattr(_frames, 'stack', None)
+    if stack is None:
+        stack = _frames.stack = []
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        # Keep the enclosing block's peak before resetting the counter for this block
+        stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+    frame = {'start': current, 'peak': current}
+    stack.append(frame)
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        current_after, peak_after = tracemalloc.get_traced_memory()
+        stack.pop()
+        frame['peak'] = max(frame['peak'], peak_after)
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+        peak_delta = frame['peak'] - frame['start']
+        retained = current_after - frame['start']
+        _record(label, peak_delta, retained)
+        if isinstance(result, dict):
+            result.update({'peak': peak_delta, 'retained': retained})
+
+def profile_memory(label=None):
+    """Decorator form of track_memory; a no-op unless tracemalloc is tracing"""
+    def decorator(func):
+        name = label or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracemalloc.is_tracing():
+                return func(*args, **kwargs)
+            with track_memory(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def check_budgets(rerun_peak, session_retained, session_id=None):
+    """Print a warning for every configured budget that was exceeded; returns the warnings"""
+    warnings = []
+    if RERUN_PEAK_BUDGET_MB and rerun_peak > RERUN_PEAK_BUDGET_MB * MB:
+        warnings.append(f"rerun peak {rerun_peak / MB:.1f} MB exceeds budget of {RERUN_PEAK_BUDGET_MB:.0f} MB")
+    if SESSION_RETAINED_BUDGET_MB and session_retained > SESSION_RETAINED_BUDGET_MB * MB:
+        warnings.append(f"session retained {session_retained / MB:.1f} MB exceeds budget of {SESSION_RETAINED_BUDGET_MB:.0f} MB")
+    for warning in warnings:
+        print(f"⚠️ Memory budget warning{f' (session {session_id})' if session_id else ''}: {warning}")
+    return warnings
+
+def top_allocations(limit=10):
+    """Largest live allocation sites as (location, MB) pairs"""
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    return [(str(stat.traceback[0]), stat.size / MB) for stat in snapshot.statistics('lineno')[:limit]]
+
+def get_memory_report():
+    """One row per instrumented path with call count, peak and retained MB"""
+    with _stats_lock:
+        rows = [{
+            'Path': label,
+            'Calls': entry['calls'],
+            'Peak_MB': round(entry['peak_max'] / MB, 2),
+            'Last_Peak_MB': round(entry['peak_last'] / MB, 2),
+            'Retained_Last_MB': round(entry['retained_last'] / MB, 2),
+            'Retained_Total_MB': round(entry['retained_total'] / MB, 2),
+        } for label, entry in _stats.items()]
+    report = pd.DataFrame(rows)
+    return report.sort_values('Peak_MB', ascending=False) if not report.empty else report
+
+def reset_memory_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -1,44 +1,228 @@
 import pandas as pd
+import numpy as np
 import joblib
 import os
+import threading
+
+# Safe ranges for each water quality parameter, in model feature order
+SAFE_RANGES = {
+    'pH': (6.5, 8.5),
+    'Solids': (0, 10000),
+    'Sulfate': (0, 400),
+    'Organic_carbon': (0, 20),
+    'Turbidity': (0, 5),
+    'Hardness': (0, 300),
+    'Chloramines': (0, 2.5),
+    'Conductivity': (0, 800),
+    'Trihalomethanes': (0, 100)
+}
+
+FEATURE_COLUMNS = list(SAFE_RANGES.keys())
+CONTRIBUTION_COLUMNS = [f"contrib_{param}" for param in FEATURE_COLUMNS]
+
+# Cascaded scoring: samples whose safe-condition count is far from the labelling threshold of 7
+# are decided by the rule itself, and only borderline samples reach the model
+RULE_FAST_PATH = os.environ.get('WQ_RULE_FAST_PATH', '1') not in ('', '0', 'false')
+RULE_SAFE_MIN = 8
+RULE_UNSAFE_MAX = 5
+
+_path_counts = {'rule_drinkable': 0, 'rule_not_drinkable': 0, 'model': 0}
+_path_lock = threading.Lock()
+
+# Resident model shared by long-running processes, keyed by path
+_model_cache = {}
 
 # Load the trained model from file
 def load_model(path="models/model.pkl"):
     """Load the trained model from disk"""
     return joblib.load(path)
 
+def get_cached_model(path="models/model.pkl"):
+    """Return a resident model, reloading only when the file on disk changes"""
+    mtime = os.path.getmtime(path)
+    cached = _model_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load_model(path))
+        _model_cache[path] = cached
+    return cached[1]
+
 # Make prediction and return (label, confidence)
 def make_prediction(model, sample_dict):
-    """Make prediction and return (label, confidence)"""
-    import numpy as np
-    import pandas as pd
+    """Make prediction and return (label, confidence); confidence is NaN when the labelling rule decided the sample"""
+    predictions, confidences = score_batch(model, pd.DataFrame([sample_dict]))
+    return int(predictions[0]), float(confidences[0])
+
+def format_confidence(confidence):
+    """Display text for a stored confidence; rule-decided samples have none"""
+    if confidence is None or pd.isna(confidence):
+        return "Rule"
+    return f"{float(confidence):.1f}%"
+
+def score_model(model, X):
+    """Return (labels, confidences) from the model alone for a feature DataFrame"""
+    X = X[FEATURE_COLUMNS].astype(float)
+    prediction_proba = model.predict_proba(X)[:, 1]
+    predictions = (prediction_proba >= 0.5).astype(int)
+    confidences = np.where(predictions == 1, prediction_proba, 1 - prediction_proba) * 100
+    return predictions, confidences
+
+# Score many samples with a single model call
+def score_batch(model, X, cascade=None, safe_min=RULE_SAFE_MIN, unsafe_max=RULE_UNSAFE_MAX, record_paths=True):
+    """Return (labels, confidences) numpy arrays for a feature DataFrame.
+
+    With the cascade on (WQ_RULE_FAST_PATH, default on) a sample with at least
+    safe_min safe parameters is drinkable and one with at most unsafe_max is
+    not, because the training labels come from that rule; only the remaining
+    samples are scored by the model. Rule-decided samples have no model
+    confidence, so their confidence is NaN. record_paths adds the samples to
+    the path counters.
+    """
+    if not (RULE_FAST_PATH if cascade is None else cascade):
+        if record_paths:
+            _record_paths(0, 0, len(X))
+        return score_model(model, X)
+
+    values = X[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    safe_counts = _safe_condition_counts(values)
+    # Samples with a missing value are left to the model, which routes them through its trees
+    complete = ~np.isnan(values).any(axis=1)
+    rule_drinkable = complete & (safe_counts >= safe_min)
+    rule_not_drinkable = complete & (safe_counts <= unsafe_max)
+    borderline = ~(rule_drinkable | rule_not_drinkable)
+    predictions = rule_drinkable.astype(int)
+    confidences = np.full(len(values), np.nan)
+    if borderline.any():
+        predictions[borderline], confidences[borderline] = score_model(
+            model, pd.DataFrame(values[borderline], columns=FEATURE_COLUMNS))
+    if record_paths:
+        _record_paths(int(rule_drinkable.sum()), int(rule_not_drinkable.sum()), int(borderline.sum()))
+    return predictions, confidences
+
+def _record_paths(rule_drinkable, rule_not_drinkable, model_scored):
+    with _path_lock:
+        _path_counts['rule_drinkable'] += rule_drinkable
+        _path_counts['rule_not_drinkable'] += rule_not_drinkable
+        _path_counts['model'] += model_scored
+
+def get_scoring_path_stats():
+    """Samples decided by each path of the cascade since startup, with the share that skipped the model"""
+    with _path_lock:
+        stats = dict(_path_counts)
+    total = sum(stats.values())
+    stats['total'] = total
+    stats['fast_path_share'] = (stats['rule_drinkable'] + stats['rule_not_drinkable']) / total if total else 0.0
+    return stats
+
+def reset_scoring_path_stats():
+    with _path_lock:
+        for key in _path_counts:
+            _path_counts[key] = 0
+
+# Default sweep for the what-if explorer
+def get_what_if_range(param, value):
+    """Return (low, high) covering the parameter's safe range, well past its limit and the sample's own value"""
+    if param == 'pH':
+        return 0.0, 14.0
+    return 0.0, float(max(SAFE_RANGES[param][1] * 2, value * 1.5))
 
-    # Convert input dict to DataFrame
-    X = pd.DataFrame([sample_dict])
-    prediction_proba = model.predict_proba(X)[0]
-    prediction = int(prediction_proba[1] >= 0.5)
-    confidence = float(prediction_proba[prediction]) * 100
-    return prediction, confidence
+def score_what_if_grid(model, sample_data, x_param, x_values, y_param=None, y_values=None):
+    """Drinkable probability (%) of a sample with one or two parameters swept over a grid.
+
+    Returns an array shaped (len(x_values),) for one parameter or
+    (len(y_values), len(x_values)) for two; the whole grid is scored in a
+    single score_batch call.
+    """
+    x_values = np.asarray(x_values, dtype=float)
+    if y_param is None:
+        xs, ys = x_values, None
+    else:
+        xs, ys = np.meshgrid(x_values, np.asarray(y_values, dtype=float))
+    base = np.array([float(sample_data[col]) for col in FEATURE_COLUMNS])
+    grid = pd.DataFrame(np.tile(base, (xs.size, 1)), columns=FEATURE_COLUMNS)
+    grid[x_param] = xs.ravel()
+    if y_param is not None:
+        grid[y_param] = ys.ravel()
+    predictions, confidences = score_batch(model, grid, record_paths=False)
+    drinkable = np.where(predictions == 1, confidences, 100 - confidences)
+    # Rule-decided points are certain under the labelling rule
+    drinkable = np.where(np.isnan(drinkable), predictions * 100.0, drinkable)
+    return drinkable.reshape(xs.shape)
+
+# Make predictions for many samples with a single model call
+def make_batch_prediction(model, samples):
+    """Make predictions for a list of sample dicts (or a DataFrame) and return a list of (label, confidence)"""
+    X = samples if isinstance(samples, pd.DataFrame) else pd.DataFrame(list(samples))
+    if X.empty:
+        return []
+    # Rule-decided samples come back with a NaN confidence
+    predictions, confidences = score_batch(model, X)
+    return [(int(p), float(c)) for p, c in zip(predictions, confidences)]
+
+# Per-model leaf contribution tables, keyed by model identity
+_contribution_cache = {}
+
+def _build_leaf_contributions(model):
+    """Precompute, for every node of every tree, the summed change in drinkable probability along its path.
+
+    Each split moves the probability from the parent's value to the child's;
+    that change is credited to the feature the parent split on. Node ids in a
+    fitted tree always exceed their parent's, so the tables fill level by level.
+    """
+    trees = model.estimators_ if hasattr(model, 'estimators_') else [model]
+    positive = list(model.classes_).index(1)
+    tables, roots = [], []
+    for tree in trees:
+        structure = tree.tree_
+        values = structure.value[:, 0, :]
+        probabilities = values[:, positive] / values.sum(axis=1)
+        table = np.zeros((structure.node_count, len(FEATURE_COLUMNS)))
+        level = np.array([0])
+        while len(level):
+            level = level[structure.children_left[level] >= 0]
+            for children in (structure.children_left[level], structure.children_right[level]):
+                table[children] = table[level]
+                table[children, structure.feature[level]] += probabilities[children] - probabilities[level]
+            level = np.concatenate([structure.children_left[level], structure.children_right[level]])
+        tables.append(table)
+        roots.append(probabilities[0])
+    return tables, float(np.mean(roots))
+
+def get_feature_contributions(model, samples):
+    """Returns (bias, DataFrame of per-parameter contributions) explaining the drinkable probability of each sample.
+
+    For every sample, bias plus the row's contributions equals the model's
+    predicted probability of the water being drinkable. Works for forests and
+    single decision trees; returns (None, None) for other model types.
+    """
+    trees = getattr(model, 'estimators_', None) or ([model] if hasattr(model, 'tree_') else None)
+    if not trees or not hasattr(trees[0], 'tree_'):
+        return None, None
+    X = samples if isinstance(samples, pd.DataFrame) else pd.DataFrame(list(samples))
+    X = X[FEATURE_COLUMNS]
+
+    cached = _contribution_cache.get(id(model))
+    if cached is None or cached[0] is not model:
+        if len(_contribution_cache) >= 4:
+            _contribution_cache.clear()
+        cached = (model,) + _build_leaf_contributions(model)
+        _contribution_cache[id(model)] = cached
+    _, tables, bias = cached
+
+    # Each tree maps every sample to a leaf; the leaf's table row is that tree's contribution
+    X_tree = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    contributions = np.zeros((len(X), len(FEATURE_COLUMNS)))
+    for tree, table in zip(trees, tables):
+        contributions += table[tree.tree_.apply(X_tree)]
+    contributions /= len(trees)
+    return bias, pd.DataFrame(contributions, columns=FEATURE_COLUMNS, index=X.index)
 
 # Analyze individual parameters for safety
 def get_parameter_analysis(sample_data):
     """Returns a dataframe showing which parameters are safe/unsafe"""
-    safe_ranges = {
-        'pH': (6.5, 8.5),
-        'Solids': (0, 10000),
-        'Sulfate': (0, 400),
-        'Organic_carbon': (0, 20),
-        'Turbidity': (0, 5),
-        'Hardness': (0, 300),
-        'Chloramines': (0, 2.5),
-        'Conductivity': (0, 800),
-        'Trihalomethanes': (0, 100)
-    }
-
     analysis = []
     for param, value in sample_data.items():
-        if param in safe_ranges:
-            min_val, max_val = safe_ranges[param]
+        if param in SAFE_RANGES:
+            min_val, max_val = SAFE_RANGES[param]
             status = "Safe ✅" if min_val <= value <= max_val else "Unsafe ⚠️"
             analysis.append({
                 'Parameter': param,
@@ -49,20 +233,48 @@ def get_parameter_analysis(sample_data):
 
     return pd.DataFrame(analysis)
 
+# Vectorized form of the labelling rule in train_model.determine_potability
+def _safe_condition_counts(values):
+    """Safe-condition counts for a float array with columns in FEATURE_COLUMNS order"""
+    low = np.array([SAFE_RANGES[param][0] if param == 'pH' else -np.inf for param in FEATURE_COLUMNS])
+    high = np.array([SAFE_RANGES[param][1] for param in FEATURE_COLUMNS])
+    return ((values >= low) & (values <= high)).sum(axis=1)
+
+def count_safe_conditions(samples_df):
+    """Returns a Series counting how many parameters of each sample satisfy the potability rule"""
+    values = samples_df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    return pd.Series(_safe_condition_counts(values), index=samples_df.index)
+
+# Vectorized safety check for many samples at once
+def get_parameter_violations(samples_df):
+    """Returns a boolean dataframe (one column per parameter) that is True where a value is outside its safe range"""
+    violations = {}
+    for param, (min_val, max_val) in SAFE_RANGES.items():
+        values = samples_df[param].astype(float)
+        violations[param] = (values < min_val) | (values > max_val)
+    return pd.DataFrame(violations, index=samples_df.index)
+
+# Conditions that trigger a precautionary suggestion; checks work on scalars and Series alike
+PRECAUTION_RULES = [
+    ('pH', lambda v: (v < 6.5) | (v > 8.5), "💡 Maintain pH between 6.5 and 8.5."),
+    ('Turbidity', lambda v: v > 5, "💡 Reduce turbidity using filtration methods."),
+    ('Chloramines', lambda v: v > 2.5, "💡 Check for excess chlorination."),
+    ('Sulfate', lambda v: v > 400, "💡 High sulfate levels can cause taste issues."),
+    ('Hardness', lambda v: v > 300, "💡 Soften hard water using ion exchange or RO."),
+    ('Conductivity', lambda v: v > 800, "💡 Check for excessive ion concentration."),
+]
+
 # Generate safety suggestions if parameters are outside safe range
 def generate_precautions(sample_data):
     """Returns a list of recommended actions based on unsafe values"""
     suggestions = []
-    if sample_data['pH'] < 6.5 or sample_data['pH'] > 8.5:
-        suggestions.append("💡 Maintain pH between 6.5 and 8.5.")
-    if sample_data['Turbidity'] > 5:
-        suggestions.append("💡 Reduce turbidity using filtration methods.")
-    if sample_data['Chloramines'] > 2.5:
-        suggestions.append("💡 Check for excess chlorination.")
-    if sample_data['Sulfate'] > 400:
-        suggestions.append("💡 High sulfate levels can cause taste issues.")
-    if sample_data['Hardness'] > 300:
-        suggestions.append("💡 Soften hard water using ion exchange or RO.")
-    if sample_data['Conductivity'] > 800:
-        suggestions.append("💡 Check for excessive ion concentration.")
+    for param, check, message in PRECAUTION_RULES:
+        if check(sample_data[param]):
+            suggestions.append(message)
     return suggestions
+
+# Vectorized form of generate_precautions for many samples at once
+def get_precaution_flags(samples_df):
+    """Returns a boolean dataframe (one column per precaution rule, named by parameter) that is True where the rule fires"""
+    flags = {param: check(samples_df[param].astype(float)) for param, check, _ in PRECAUTION_RULES}
+    return pd.DataFrame(flags, index=samples_df.index)
@@ -0,0 +1,211 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS, SAFE_RANGES
+from utils.data_handler import get_all_predictions, get_prediction_aggregates, get_data_version, get_user_predictions, PREDICTION_SHARDS
+from utils.shared_cache import compute_aggregates
+from utils.archive import load_archived_predictions
+
+# Columns with an equality index; each maps a value to the row positions holding it
+INDEXED_COLUMNS = ['state', 'region', 'user_id']
+GROUP_BY_COLUMNS = ['state', 'region', 'user_id', 'potability', 'date']
+METRIC_COLUMNS = ['potability', 'confidence'] + FEATURE_COLUMNS
+METRIC_FUNCTIONS = ['count', 'sum', 'mean', 'min', 'max']
+
+_lock = threading.Lock()
+_index_cache = {'version': None, 'frame': None, 'indexes': None, 'date_order': None, 'sorted_timestamps': None}
+
+def _get_indexed_frame():
+    """Return the prediction frame and its indexes, rebuilding them only after the data changes"""
+    version = get_data_version('predictions')
+    with _lock:
+        if _index_cache['version'] != version:
+            frame = get_all_predictions().reset_index(drop=True)
+            indexes = {}
+            if not frame.empty:
+                for col in INDEXED_COLUMNS:
+                    if col in frame.columns:
+                        indexes[col] = frame.groupby(col, sort=False).indices
+                timestamps = frame['timestamp'].astype(str).to_numpy(dtype=str)
+                date_order = np.argsort(timestamps, kind='stable')
+                sorted_timestamps = timestamps[date_order]
+            else:
+                date_order = np.array([], dtype=np.int64)
+                sorted_timestamps = np.array([], dtype=str)
+            _index_cache.update({
+                'version': version, 'frame': frame, 'indexes': indexes,
+                'date_order': date_order, 'sorted_timestamps': sorted_timestamps
+            })
+        return _index_cache['frame'], _index_cache
+
+def has_filters(filters):
+    """True when a filter spec restricts anything"""
+    return bool(filters) and any(value not in (None, [], {}, '') for value in filters.values())
+
+def _index_candidates(filters, cache):
+    """Row positions offered by each usable index, keyed by access path name"""
+    candidates = {}
+    for col in INDEXED_COLUMNS:
+        values = filters.get(col)
+        if values and col in cache['indexes']:
+            index = cache['indexes'][col]
+            positions = [index[value] for value in values if value in index]
+            candidates[f"index:{col}"] = np.concatenate(positions) if positions else np.array([], dtype=np.int64)
+
+    date_from, date_to = filters.get('date_from'), filters.get('date_to')
+    if date_from or date_to:
+        sorted_timestamps = cache['sorted_timestamps']
+        start = np.searchsorted(sorted_timestamps, str(date_from), side='left') if date_from else 0
+        # '~' sorts after every digit, so a bare date includes the whole day
+        end = np.searchsorted(sorted_timestamps, f"{date_to}~", side='right') if date_to else len(sorted_timestamps)
+        candidates['index:date'] = cache['date_order'][start:end]
+    return candidates
+
+def _predicate_mask(frame, filters):
+    """Vectorized mask for every predicate in a filter spec"""
+    mask = np.ones(len(frame), dtype=bool)
+    for col in INDEXED_COLUMNS:
+        values = filters.get(col)
+        if values:
+            mask &= frame[col].isin(values).to_numpy()
+    timestamps = frame['timestamp'].astype(str)
+    if filters.get('date_from'):
+        mask &= (timestamps >= str(filters['date_from'])).to_numpy()
+    if filters.get('date_to'):
+        mask &= (timestamps <= f"{filters['date_to']}~").to_numpy()
+    if filters.get('potability') is not None:
+        mask &= (frame['potability'] == int(filters['potability'])).to_numpy()
+    for param, (low, high) in (filters.get('parameter_ranges') or {}).items():
+        values = frame[param]
+        if low is not None:
+            mask &= (values >= low).to_numpy()
+        if high is not None:
+            mask &= (values <= high).to_numpy()
+    for param in filters.get('violations_of') or []:
+        min_val, max_val = SAFE_RANGES[param]
+        mask &= ((frame[param] < min_val) | (frame[param] > max_val)).to_numpy()
+    return mask
+
+def query_predictions(filters=None):
+    """Return (matching prediction rows, access path) for a filter spec.
+
+    Supported keys: state, region, user_id (lists of values), date_from and
+    date_to ('YYYY-MM-DD'), potability (0/1), parameter_ranges
+    ({param: (low, high)}) and violations_of (list of parameters outside
+    their safe range). The most selective index is used to narrow the rows
+    before the remaining predicates are applied.
+    """
+    frame, cache = _get_indexed_frame()
+    if frame.empty or not has_filters(filters):
+        return frame.copy(deep=False), 'full'
+
+    candidates = _index_candidates(filters, cache)
+    if candidates:
+        access_path, positions = min(candidates.items(), key=lambda item: len(item[1]))
+        subset = frame.iloc[np.sort(positions)]
+    else:
+        access_path, subset = 'scan', frame
+    return subset[_predicate_mask(subset, filters)], access_path
+
+def get_user_delta(user_id, last_timestamp=None, seen_ids=()):
+    """Return (rows, hot_count) for a user's predictions past a high-water mark.
+
+    rows holds the user's predictions at or after last_timestamp whose ids are
+    not in seen_ids; hot_count is how many predictions the user has in the hot
+    store, so callers can tell appends from rewrites such as compaction.
+    When the store is sharded only the user's own shard is read.
+    """
+    if PREDICTION_SHARDS:
+        user_rows = get_user_predictions(user_id)
+        if user_rows.empty:
+            return user_rows, 0
+        rows = user_rows
+        if last_timestamp:
+            rows = rows[rows['timestamp'].astype(str) >= str(last_timestamp)]
+        if seen_ids:
+            rows = rows[~rows['prediction_id'].isin(list(seen_ids))]
+        return rows, len(user_rows)
+
+    frame, cache = _get_indexed_frame()
+    hot_count = len(cache['indexes'].get('user_id', {}).get(user_id, []))
+    if hot_count == 0:
+        return frame.iloc[0:0], 0
+    filters = {'user_id': [user_id], 'date_from': last_timestamp}
+    rows, _ = query_predictions(filters)
+    if seen_ids:
+        rows = rows[~rows['prediction_id'].isin(list(seen_ids))]
+    return rows, hot_count
+
+def query_archived_predictions(filters=None):
+    """Return archived prediction rows matching a filter spec; archives are scanned, not indexed"""
+    archived_df = load_archived_predictions()
+    if archived_df.empty or not has_filters(filters):
+        return archived_df
+    return archived_df[_predicate_mask(archived_df, filters)]
+
+def get_filtered_aggregates(filters=None, include_archive=False):
+    """Return the overview aggregates, from the precomputed snapshot when nothing is filtered.
+
+    include_archive adds the archived predictions' aggregates to the unfiltered
+    figures; filtered figures always cover the hot store only.
+    """
+    if not has_filters(filters):
+        return get_prediction_aggregates(include_archive)
+    filtered_df, _ = query_predictions(filters)
+    return compute_aggregates(filtered_df)
+
+def aggregate_predictions(filters=None, group_by=None, metrics=None):
+    """Return (aggregated DataFrame, access path) for a group-by spec.
+
+    metrics is a list of 'column:function' strings, e.g. 'potability:mean'
+    or 'pH:max'; it defaults to a row count.
+    """
+    group_by = list(group_by or [])
+    metrics = list(metrics or ['potability:count'])
+
+    # Precomputed per-region counts answer the most common question without touching rows
+    if (not has_filters(filters) and group_by == ['region']
+            and set(metrics) <= {'potability:count', 'potability:sum', 'potability:mean'}):
+        regions = get_prediction_aggregates()['regions']
+        result = pd.DataFrame(
+            [{'region': region, 'potability:count': count, 'potability:sum': drinkable,
+              'potability:mean': drinkable / count if count else 0.0}
+             for region, (count, drinkable) in regions.items()]
+        )
+        if result.empty:
+            return result, 'aggregate'
+        return result.set_index('region')[metrics], 'aggregate'
+
+    filtered_df, access_path = query_predictions(filters)
+    if filtered_df.empty:
+        return pd.DataFrame(), access_path
+    if 'date' in group_by:
+        filtered_df = filtered_df.assign(date=filtered_df['timestamp'].astype(str).str[:10])
+
+    named = {}
+    for metric in metrics:
+        column, function = metric.split(':')
+        named[metric] = pd.NamedAgg(column=column, aggfunc=function)
+    if group_by:
+        result = filtered_df.groupby(group_by).agg(**named)
+    else:
+        result = pd.DataFrame([{
+            metric: filtered_df[metric.split(':')[0]].agg(metric.split(':')[1]) for metric in metrics
+        }])
+    return result.round(2), access_path
+
+def get_filter_options():
+    """Distinct values and date bounds for building a filter bar"""
+    frame, cache = _get_indexed_frame()
+    if frame.empty:
+        return {'states': [], 'regions': {}, 'users': [], 'date_min': None, 'date_max': None}
+    regions = frame.dropna(subset=['state', 'region']).groupby('state')['region'].unique()
+    return {
+        'states': sorted(cache['indexes'].get('state', {}).keys()),
+        'regions': {state: sorted(values) for state, values in regions.items()},
+        'users': sorted(cache['indexes'].get('user_id', {}).keys()),
+        'date_min': cache['sorted_timestamps'][0][:10],
+        'date_max': cache['sorted_timestamps'][-1][:10],
+    }
@@ -0,0 +1,228 @@
+import copy
+import json
+import math
+import os
+import threading
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS
+
+# One JSON file per region, so an insert rewrites only the regions it touches
+STATS_DIR = 'data/region_stats'
+LEGACY_STATS_PATH = 'data/region_stats.json'
+TRACKED_COLUMNS = FEATURE_COLUMNS + ['potability']
+
+EWMA_ALPHA = 0.1        # weight of the newest sample in the moving average
+Z_THRESHOLD = 3.0       # |z| above this flags a single-sample outlier
+CUSUM_DRIFT = 0.5       # slack (in standard deviations) before CUSUM accumulates
+CUSUM_THRESHOLD = 5.0   # accumulated shift that flags a sustained drift
+MIN_SAMPLES = 10        # no flags until a region has this many samples
+
+_lock = threading.Lock()
+# Region file name -> (signature, stats), re-read only when the file changes
+_cache = {}
+
+def region_key(state, region):
+    """Normalized key for a state/region pair"""
+    return f"{str(state).strip().upper()} / {str(region).strip().title()}"
+
+def _new_region():
+    return {
+        'count': 0,
+        'n': {col: 0 for col in TRACKED_COLUMNS},
+        'mean': {col: 0.0 for col in TRACKED_COLUMNS},
+        'm2': {col: 0.0 for col in TRACKED_COLUMNS},
+        'ewma': {col: None for col in TRACKED_COLUMNS},
+        'cusum_pos': {col: 0.0 for col in FEATURE_COLUMNS},
+        'cusum_neg': {col: 0.0 for col in FEATURE_COLUMNS},
+        'last_z': {col: 0.0 for col in FEATURE_COLUMNS},
+        'anomalies': [],
+        'last_timestamp': None,
+        'last_anomaly_timestamp': None,
+    }
+
+def _samples(stats, col):
+    # Stats saved before per-column counts existed count every sample for every column
+    return stats.get('n', {}).get(col, stats['count'])
+
+def _std(stats, col):
+    n = _samples(stats, col)
+    if n < 2:
+        return 0.0
+    return math.sqrt(stats['m2'][col] / (n - 1))
+
+def _finite(value):
+    """Return value as a float, or None when it is missing, non-numeric or not finite"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def update_region(stats, record):
+    """Fold one prediction record into a region's running statistics in O(1); non-finite values are skipped"""
+    values = {col: _finite(record.get(col)) for col in TRACKED_COLUMNS}
+    
+    # Score the sample against the statistics as they were before it arrived
+    anomalies = []
+    for col in FEATURE_COLUMNS:
+        value = values[col]
+        if value is None:
+            continue
+        std = _std(stats, col)
+        z = (value - stats['mean'][col]) / std if std > 0 else 0.0
+        stats['last_z'][col] = round(z, 3)
+        stats['cusum_pos'][col] = max(0.0, stats['cusum_pos'][col] + z - CUSUM_DRIFT)
+        stats['cusum_neg'][col] = max(0.0, stats['cusum_neg'][col] - z - CUSUM_DRIFT)
+        if _samples(stats, col) >= MIN_SAMPLES:
+            if abs(z) > Z_THRESHOLD:
+                anomalies.append(f"{col} outlier (z={z:.1f})")
+            if stats['cusum_pos'][col] > CUSUM_THRESHOLD:
+                anomalies.append(f"{col} drifting up")
+                stats['cusum_pos'][col] = 0.0
+            if stats['cusum_neg'][col] > CUSUM_THRESHOLD:
+                anomalies.append(f"{col} drifting down")
+                stats['cusum_neg'][col] = 0.0
+
+    # Welford mean/variance and EWMA updates, counted per column so skipped values do not skew the mean
+    counts = stats.setdefault('n', {col: stats['count'] for col in TRACKED_COLUMNS})
+    stats['count'] += 1
+    for col in TRACKED_COLUMNS:
+        value = values[col]
+        if value is None:
+            continue
+        counts[col] = counts.get(col, stats['count'] - 1) + 1
+        delta = value - stats['mean'][col]
+        stats['mean'][col] += delta / counts[col]
+        stats['m2'][col] += delta * (value - stats['mean'][col])
+        previous = stats['ewma'][col]
+        stats['ewma'][col] = value if previous is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * previous
+
+    stats['anomalies'] = anomalies
+    stats['last_timestamp'] = record.get('timestamp')
+    if anomalies:
+        stats['last_anomaly_timestamp'] = record.get('timestamp')
+    return stats
+
+def _region_path(key):
+    return os.path.join(STATS_DIR, f"{quote(key, safe='')}.json")
+
+def _load_region(path, signature):
+    cached = _cache.get(path)
+    if cached is None or cached[0] != signature:
+        try:
+            with open(path) as f:
+                cached = (signature, json.load(f))
+        except (json.JSONDecodeError, OSError):
+            cached = (signature, None)
+        _cache[path] = cached
+    return cached[1]
+
+def _load(key):
+    """Statistics for one region, or None when it has none yet"""
+    path = _region_path(key)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _cache.pop(path, None)
+        return None
+    return _load_region(path, (stat.st_mtime_ns, stat.st_size))
+
+def _load_all():
+    """Statistics for every region, re-reading only the files that changed"""
+    all_stats = {}
+    try:
+        entries = list(os.scandir(STATS_DIR))
+    except OSError:
+        return all_stats
+    for entry in entries:
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        stats = _load_region(entry.path, (stat.st_mtime_ns, stat.st_size))
+        if stats is not None:
+            all_stats[unquote(entry.name[:-len('.json')])] = stats
+    return all_stats
+
+def _save(key, stats):
+    os.makedirs(STATS_DIR, exist_ok=True)
+    path = _region_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, path)
+    stat = os.stat(path)
+    _cache[path] = ((stat.st_mtime_ns, stat.st_size), stats)
+
+def _write_lock():
+    # Imported here because data_handler imports this module
+    from utils.data_handler import store_write_lock
+    return store_write_lock('region_stats')
+
+def update_region_stats(records):
+    """Update running statistics for each saved prediction record under the cross-process write lock.
+
+    Only the regions present in records are read and rewritten.
+    """
+    with _write_lock(), _lock:
+        touched = {}
+        for record in records:
+            key = region_key(record.get('state', ''), record.get('region', ''))
+            if key not in touched:
+                previous = _load(key)
+                touched[key] = copy.deepcopy(previous) if previous else _new_region()
+            update_region(touched[key], record)
+        for key, stats in touched.items():
+            _save(key, stats)
+
+def rebuild_region_stats(predictions_df):
+    """Recompute all region statistics from stored predictions, in timestamp order.
+
+    Missing values are skipped per column, as on the incremental path.
+    """
+    all_stats = {}
+    if not predictions_df.empty:
+        ordered = predictions_df.sort_values('timestamp')
+        for record in ordered.to_dict(orient='records'):
+            key = region_key(record['state'], record['region'])
+            all_stats[key] = update_region(all_stats.get(key) or _new_region(), record)
+    with _write_lock(), _lock:
+        os.makedirs(STATS_DIR, exist_ok=True)
+        for key, stats in all_stats.items():
+            _save(key, stats)
+        # Regions no longer present in the store, and the single-file layout, are removed
+        for key in set(_load_all()) - set(all_stats):
+            os.remove(_region_path(key))
+            _cache.pop(_region_path(key), None)
+        if os.path.exists(LEGACY_STATS_PATH):
+            os.remove(LEGACY_STATS_PATH)
+    return all_stats
+
+def get_region_stats(key=None):
+    """Return running statistics for one region key, or for all regions"""
+    if key is None:
+        return _load_all()
+    return _load(key)
+
+def get_region_stats_summary():
+    """Return one row per region with count, potability rate, drift flags and parameter means"""
+    rows = []
+    for key, stats in _load_all().items():
+        row = {
+            'Region': key,
+            'Samples': stats['count'],
+            'Potability_Rate': round(stats['mean']['potability'], 3),
+            'Recent_Potability': round(stats['ewma']['potability'] or 0.0, 3),
+            'Anomaly': ', '.join(stats['anomalies']) if stats['anomalies'] else '',
+            'Last_Anomaly': stats.get('last_anomaly_timestamp') or '',
+        }
+        for col in FEATURE_COLUMNS:
+            row[f"{col}_mean"] = round(stats['mean'][col], 2)
+            row[f"{col}_std"] = round(_std(stats, col), 2)
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,250 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import FEATURE_COLUMNS, CONTRIBUTION_COLUMNS, SAFE_RANGES
+
+PREDICTIONS_PATH = 'data/predictions.csv'
+CACHE_DIR = 'data/.cache'
+GENERATION_PATH = os.path.join(CACHE_DIR, 'generation.json')
+BUILD_LOCK_PATH = os.path.join(CACHE_DIR, 'build.lock')
+STALE_LOCK_SECONDS = 60
+KEEP_GENERATIONS = 2
+
+# What this process currently has attached
+_attached = {'generation': None, 'frame': None, 'aggregates': None}
+_lock = threading.Lock()
+
+def _source_signature(path=PREDICTIONS_PATH):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _read_generation():
+    try:
+        with open(GENERATION_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def compute_aggregates(predictions_df):
+    """Precompute the global figures every admin view needs"""
+    if predictions_df.empty:
+        return {'total_predictions': 0, 'drinkable_count': 0, 'avg_confidence': 0.0,
+                'confidence_count': 0, 'contribution_count': 0, 'regions': {}, 'violations': {}, 'parameter_means': {}, 'parameter_means_by_potability': {},
+                'user_activity': {}, 'mean_abs_contributions': {}}
+
+    regions = predictions_df.groupby('region')['potability'].agg(['count', 'sum'])
+    violations = {}
+    for param, (min_val, max_val) in SAFE_RANGES.items():
+        if param in predictions_df.columns:
+            violations[param] = int(((predictions_df[param] < min_val) | (predictions_df[param] > max_val)).sum())
+    params = [col for col in FEATURE_COLUMNS if col in predictions_df.columns]
+    by_potability = predictions_df.groupby('potability')[params].mean()
+    contributions = {}
+    contribution_count = int(predictions_df[CONTRIBUTION_COLUMNS[0]].notna().sum()) if CONTRIBUTION_COLUMNS[0] in predictions_df.columns else 0
+    for param, col in zip(FEATURE_COLUMNS, CONTRIBUTION_COLUMNS):
+        if col in predictions_df.columns and predictions_df[col].notna().any():
+            contributions[param] = float(predictions_df[col].abs().mean())
+
+    return {
+        'total_predictions': int(len(predictions_df)),
+        'drinkable_count': int((predictions_df['potability'] == 1).sum()),
+        'avg_confidence': float(predictions_df['confidence'].mean()),
+        # Counts behind the averages, so aggregates of disjoint row sets can be merged
+        'confidence_count': int(predictions_df['confidence'].notna().sum()),
+        'contribution_count': contribution_count,
+        'regions': {str(region): [int(row['count']), int(row['sum'])] for region, row in regions.iterrows()},
+        'violations': violations,
+        'parameter_means': {col: float(value) for col, value in predictions_df[params].mean().items()},
+        'parameter_means_by_potability': {
+            str(int(potability)): {col: float(value) for col, value in row.items()}
+            for potability, row in by_potability.iterrows()
+        },
+        'user_activity': {str(user): int(count) for user, count in predictions_df.groupby('user_id').size().items()},
+        'mean_abs_contributions': contributions,
+    }
+
+def _weighted_mean(pairs):
+    """Mean of (value, weight) pairs, skipping missing values"""
+    pairs = [(value, weight) for value, weight in pairs if weight and value is not None and value == value]
+    total = sum(weight for _, weight in pairs)
+    return sum(value * weight for value, weight in pairs) / total if total else None
+
+def merge_aggregates(parts):
+    """Combine aggregates computed by compute_aggregates over disjoint sets of predictions.
+
+    Averages are weighted by the counts stored with each part; parts written
+    before those counts existed are weighted by their row count.
+    """
+    parts = [part for part in parts if part.get('total_predictions')]
+    if not parts:
+        return compute_aggregates(pd.DataFrame())
+    if len(parts) == 1:
+        return parts[0]
+
+    def summed(key):
+        merged = {}
+        for part in parts:
+            for name, value in part[key].items():
+                merged[name] = merged.get(name, 0) + value
+        return merged
+
+    def averaged(means_of, weight_of):
+        names = {name for part in parts for name in means_of(part)}
+        means = {name: _weighted_mean((means_of(part).get(name), weight_of(part)) for part in parts) for name in names}
+        return {name: value for name, value in means.items() if value is not None}
+
+    regions = {}
+    for part in parts:
+        for region, (count, drinkable) in part['regions'].items():
+            merged = regions.setdefault(region, [0, 0])
+            merged[0] += count
+            merged[1] += drinkable
+    by_potability = {
+        '1': averaged(lambda part: part['parameter_means_by_potability'].get('1', {}),
+                      lambda part: part['drinkable_count']),
+        '0': averaged(lambda part: part['parameter_means_by_potability'].get('0', {}),
+                      lambda part: part['total_predictions'] - part['drinkable_count']),
+    }
+    confidence_weight = lambda part: part.get('confidence_count', part['total_predictions'])
+    contribution_weight = lambda part: part.get('contribution_count', part['total_predictions'])
+    avg_confidence = _weighted_mean((part['avg_confidence'], confidence_weight(part)) for part in parts)
+    return {
+        'total_predictions': sum(part['total_predictions'] for part in parts),
+        'drinkable_count': sum(part['drinkable_count'] for part in parts),
+        'avg_confidence': avg_confidence if avg_confidence is not None else 0.0,
+        'confidence_count': sum(confidence_weight(part) for part in parts),
+        'contribution_count': sum(part.get('contribution_count', 0) for part in parts),
+        'regions': regions,
+        'violations': summed('violations'),
+        'parameter_means': averaged(lambda part: part['parameter_means'], lambda part: part['total_predictions']),
+        'parameter_means_by_potability': {label: means for label, means in by_potability.items() if means},
+        'user_activity': summed('user_activity'),
+        'mean_abs_contributions': averaged(lambda part: part['mean_abs_contributions'], contribution_weight),
+    }
+
+def build_snapshot(path=PREDICTIONS_PATH, source=None, reader=None):
+    """Parse the prediction store once and publish typed column files plus aggregates as a new generation.
+
+    source identifies the store contents the snapshot is built from (the data
+    version when the caller has one); it must be taken before the store is read.
+    reader returns the store as a DataFrame when it is not the single CSV at path.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    signature = source if source is not None else _source_signature(path)
+    predictions_df = reader() if reader is not None else pd.read_csv(path)
+
+    current = _read_generation()
+    generation = (current['generation'] + 1) if current else 1
+    final_dir = os.path.join(CACHE_DIR, f"gen_{generation}")
+    tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    columns = []
+    for name in predictions_df.columns:
+        series = predictions_df[name]
+        if series.dtype.kind in 'biuf':
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), series.to_numpy())
+            columns.append({'name': name, 'kind': 'numeric'})
+        else:
+            # Strings are stored as integer codes into a sorted category list kept in the metadata;
+            # the codes use the width pandas picks, so readers can map them without a copy
+            categorical = pd.Categorical(series.astype(str).where(series.notna()))
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), categorical.codes)
+            columns.append({'name': name, 'kind': 'category', 'categories': categorical.categories.tolist()})
+
+    meta = {
+        'generation': generation,
+        'source': signature,
+        'rows': int(len(predictions_df)),
+        'columns': columns,
+        'aggregates': compute_aggregates(predictions_df),
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_dir, final_dir)
+
+    # Publishing the generation file is the commit point readers watch
+    tmp_generation = f"{GENERATION_PATH}.{os.getpid()}.tmp"
+    with open(tmp_generation, 'w') as f:
+        json.dump({'generation': generation, 'source': signature, 'dir': final_dir}, f)
+    os.replace(tmp_generation, GENERATION_PATH)
+
+    # Old generations can be removed; processes that still map them keep valid pages until they re-attach
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith('gen_') and not entry.endswith('.tmp'):
+            try:
+                if int(entry[4:]) <= generation - KEEP_GENERATIONS:
+                    shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+            except ValueError:
+                continue
+    return generation
+
+def _try_build(path, source, reader):
+    """Build a new generation unless another process is already doing it"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(BUILD_LOCK_PATH) > STALE_LOCK_SECONDS:
+            os.remove(BUILD_LOCK_PATH)
+    except OSError:
+        pass
+    try:
+        fd = os.open(BUILD_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    try:
+        os.close(fd)
+        build_snapshot(path, source, reader)
+        return True
+    finally:
+        try:
+            os.remove(BUILD_LOCK_PATH)
+        except OSError:
+            pass
+
+def _attach(info):
+    """Map a generation's column files read-only into this process"""
+    with open(os.path.join(info['dir'], 'meta.json')) as f:
+        meta = json.load(f)
+    data = {}
+    for column in meta['columns']:
+        values = np.load(os.path.join(info['dir'], f"{column['name']}.npy"), mmap_mode='r')
+        if column['kind'] == 'numeric':
+            data[column['name']] = values
+        elif column['kind'] == 'category':
+            # The codes stay mapped and only the category list is held by each process; categories
+            # are sorted, so ordering, min and max match the strings
+            categories = pd.Index(column['categories'], dtype=object)
+            data[column['name']] = pd.Categorical.from_codes(values, categories=categories, ordered=True, validate=False)
+        else:
+            # Generations written before categorical columns keep unsorted categories; decode them
+            categories = np.array(column['categories'] + [np.nan], dtype=object)
+            data[column['name']] = categories[values]
+    frame = pd.DataFrame(data, columns=[c['name'] for c in meta['columns']], copy=False)
+    _attached.update({'generation': info['generation'], 'frame': frame, 'aggregates': meta['aggregates']})
+
+def get_predictions_snapshot(path=PREDICTIONS_PATH, version=None, reader=None):
+    """Return (predictions DataFrame, aggregates) from the shared cache, rebuilding it when the store changed.
+
+    version is the store's data version; without it the file's mtime and size are used.
+    """
+    with _lock:
+        source = version if version is not None else _source_signature(path)
+        info = _read_generation()
+        if info is None or info['source'] != source:
+            if _try_build(path, source, reader):
+                info = _read_generation()
+            else:
+                # Another process is building this version; the published generation (if any) is
+                # older than the store, so read the store directly this time
+                predictions_df = reader() if reader is not None else pd.read_csv(path)
+                return predictions_df, compute_aggregates(predictions_df)
+        if _attached['generation'] != info['generation']:
+            _attach(info)
+        # Hand out a shallow copy so callers can add columns without touching the shared frame
+        return _attached['frame'].copy(deep=False), _attached['aggregates']
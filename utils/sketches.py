@@ -0,0 +1,188 @@
+import base64
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def _hash_keys(keys, hash_key="wqsketch00000000"):
+    """64-bit hashes of string keys, vectorized and stable across processes"""
+    keys = np.asarray(pd.Series(keys, dtype=object).astype(str), dtype=object)
+    return pd.util.hash_array(keys, hash_key=hash_key, categorize=False)
+
+
+class HyperLogLog:
+    """Distinct-count sketch; the relative standard error is 1.04 / sqrt(2**p)"""
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, keys):
+        hashes = _hash_keys(keys)
+        if len(hashes) == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        remainder = (hashes & np.uint64((1 << (64 - self.p)) - 1)).astype(np.float64)
+        # frexp gives the exact bit length of the remaining bits (they fit in a float64 mantissa)
+        _, bit_length = np.frexp(remainder)
+        rank = ((64 - self.p) - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def to_dict(self):
+        return {'p': self.p, 'registers': base64.b64encode(self.registers.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data):
+        registers = np.frombuffer(base64.b64decode(data['registers']), dtype=np.uint8).copy()
+        return cls(data['p'], registers)
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang and Liberty); rank error shrinks roughly as 1/k"""
+
+    def __init__(self, k=128, levels=None, n=0, coin=0):
+        self.k = k
+        self.levels = levels if levels is not None else [[]]
+        self.n = n
+        self.coin = coin
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items = sorted(items)
+            # An odd item out stays behind; every other remaining item is promoted with double weight
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[self.coin::2])
+            self.coin ^= 1
+            self.levels[level] = keep
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.levels[0].extend(values.tolist())
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at the given quantiles (0..1); None when empty"""
+        if self.n == 0:
+            return [None for _ in qs]
+        values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.levels])
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.float64) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side='left')
+        return values[np.minimum(positions, len(values) - 1)].tolist()
+
+    def rank_error(self):
+        return 1.7 / self.k
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'coin': self.coin,
+                'levels': [[round(v, 4) for v in items] for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['k'], [list(items) for items in data['levels']], data['n'], data['coin'])
+
+
+class CountMinSketch:
+    """Frequency sketch with a small candidate list for heavy hitters.
+
+    Estimates never undercount and overcount by at most e / width of the total
+    with probability 1 - exp(-depth).
+    """
+
+    def __init__(self, width=1024, depth=4, table=None, candidates=None, top_k=20):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+        self.candidates = candidates if candidates is not None else []
+        self.total = int(self.table[0].sum())
+
+    def _columns(self, keys):
+        return [(_hash_keys(keys, f"wqcms{row:011d}") % np.uint64(self.width)).astype(np.int64) for row in range(self.depth)]
+
+    def estimate(self, keys):
+        if len(keys) == 0:
+            return np.array([], dtype=np.int64)
+        columns = self._columns(keys)
+        return np.min([self.table[row, columns[row]] for row in range(self.depth)], axis=0)
+
+    def _refresh_candidates(self, keys):
+        keys = sorted(set(self.candidates) | set(keys))
+        estimates = self.estimate(keys)
+        top = np.argsort(-estimates, kind='stable')[:self.top_k]
+        self.candidates = [keys[i] for i in top]
+
+    def update(self, keys):
+        keys, counts = np.unique(np.asarray(pd.Series(keys, dtype=object).astype(str), dtype=str), return_counts=True)
+        if len(keys) == 0:
+            return
+        for row, column in enumerate(self._columns(keys)):
+            np.add.at(self.table[row], column, counts)
+        self.total += int(counts.sum())
+        self._refresh_candidates(keys.tolist())
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        self._refresh_candidates(other.candidates)
+        return self
+
+    def top(self, n=10):
+        """Heaviest keys as (key, estimated count) pairs"""
+        estimates = self.estimate(self.candidates)
+        return [(key, int(count)) for key, count in sorted(zip(self.candidates, estimates), key=lambda item: -item[1])[:n]]
+
+    def error_bound(self):
+        return math.e / self.width * self.total
+
+    def to_dict(self):
+        return {'width': self.width, 'depth': self.depth, 'top_k': self.top_k, 'candidates': self.candidates,
+                'table': base64.b64encode(self.table.astype(np.int64).tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = np.frombuffer(base64.b64decode(data['table']), dtype=np.int64).reshape(data['depth'], data['width']).copy()
+        return cls(data['width'], data['depth'], table, list(data['candidates']), data['top_k'])
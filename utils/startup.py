@@ -0,0 +1,99 @@
+import threading
+import time
+
+from utils.data_handler import initialize_data_files, get_all_predictions, get_all_users, get_prediction_aggregates
+from utils.ml_model import SAFE_RANGES, get_cached_model, get_feature_contributions
+from utils.region_stats import get_region_stats
+
+# Process-wide startup state; reruns and new sessions only read it
+_state = {'status': 'not_started', 'started_at': None, 'finished_at': None, 'steps': {}}
+_lock = threading.Lock()
+# Held while storage is initialized so sessions arriving meanwhile wait for it
+_storage_lock = threading.Lock()
+_ready = threading.Event()
+
+def _run_step(name, func):
+    """Run one startup step and record its duration and outcome; a failed step does not stop the others"""
+    with _lock:
+        _state['steps'][name] = {'status': 'running', 'seconds': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        func()
+        outcome = {'status': 'done', 'error': None}
+    except Exception as e:
+        print(f"Startup step {name} failed: {e}")
+        outcome = {'status': 'failed', 'error': str(e)}
+    with _lock:
+        _state['steps'][name] = {**outcome, 'seconds': round(time.perf_counter() - start, 3)}
+    return outcome['status'] == 'done'
+
+def _warm_model():
+    model = get_cached_model()
+    # Builds the per-tree contribution tables the first explanation would otherwise pay for
+    sample = {param: (low + high) / 2 for param, (low, high) in SAFE_RANGES.items()}
+    get_feature_contributions(model, [sample])
+
+def _warm_query_index():
+    from utils.query_engine import get_filter_options
+    get_filter_options()
+
+def _warm_pages():
+    # Importing the dashboards pulls in plotly and the chart helpers
+    import pages.user_dashboard
+    import pages.admin_dashboard
+
+WARM_UP_STEPS = [
+    ('model', _warm_model),
+    ('predictions', get_all_predictions),
+    ('aggregates', get_prediction_aggregates),
+    ('query_index', _warm_query_index),
+    ('users', get_all_users),
+    ('region_stats', get_region_stats),
+    ('pages', _warm_pages),
+]
+
+def _warm_up():
+    failed = [name for name, func in WARM_UP_STEPS if not _run_step(name, func)]
+    with _lock:
+        _state['status'] = 'degraded' if failed else 'ready'
+        _state['finished_at'] = time.time()
+    _ready.set()
+
+def ensure_started():
+    """Initialize storage once per process and preload the model and data in the background.
+
+    Storage is initialized before returning because every page reads it;
+    the rest runs on a daemon thread. Calls made while storage is being
+    initialized wait for it; later calls return immediately unless storage
+    initialization failed, in which case the next call retries it.
+    """
+    with _storage_lock:
+        with _lock:
+            if _state['status'] != 'not_started':
+                return
+            _state['status'] = 'starting'
+            _state['started_at'] = time.time()
+        if not _run_step('storage', initialize_data_files):
+            # Leave startup pending so the next rerun tries again
+            with _lock:
+                _state['status'] = 'not_started'
+            return
+    threading.Thread(target=_warm_up, name='startup-warm-up', daemon=True).start()
+
+def wait_until_ready(timeout=None):
+    """Block until the background warm-up has finished; returns False on timeout"""
+    return _ready.wait(timeout)
+
+def is_ready():
+    return _ready.is_set()
+
+def get_startup_status():
+    """Overall status ('not_started', 'starting', 'ready' or 'degraded'), elapsed seconds and per-step results"""
+    with _lock:
+        status = {
+            'status': _state['status'],
+            'steps': {name: dict(step) for name, step in _state['steps'].items()},
+        }
+        if _state['started_at']:
+            status['elapsed'] = round((_state['finished_at'] or time.time()) - _state['started_at'], 3)
+    return status
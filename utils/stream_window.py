@@ -0,0 +1,79 @@
+import numpy as np
+
+from utils.ml_model import PRECAUTION_RULES
+
+RULE_PARAMETERS = [param for param, _, _ in PRECAUTION_RULES]
+RULE_MESSAGES = {param: message for param, _, message in PRECAUTION_RULES}
+
+
+class SiteWindow:
+    """Sliding window over the most recent readings of one site, stored in fixed-size ring buffers.
+
+    Running sums are adjusted as readings enter and leave the window, so
+    aggregates cost O(1) to read and pushing k readings costs O(k).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.potability = np.zeros(size, dtype=np.int8)
+        self.confidence = np.zeros(size, dtype=np.float64)
+        self.flags = np.zeros((size, len(RULE_PARAMETERS)), dtype=np.bool_)
+        self.head = 0          # next slot to write
+        self.count = 0         # readings currently in the window
+        self.total = 0         # readings ever pushed
+        self.potable_sum = 0
+        self.confidence_sum = 0.0
+        self.confidence_count = 0  # readings with a model confidence; rule-decided readings have none
+        self.flag_counts = np.zeros(len(RULE_PARAMETERS), dtype=np.int64)
+        self.active_alerts = set()
+
+    def push(self, potability, confidence, flags):
+        """Append a batch of readings (arrays of equal length) to the window"""
+        n = len(potability)
+        self.total += n
+        if n > self.size:
+            potability, confidence, flags = potability[-self.size:], confidence[-self.size:], flags[-self.size:]
+            n = self.size
+
+        slots = (self.head + np.arange(n)) % self.size
+        # Readings being overwritten leave the window once it is full
+        evicted = max(0, self.count + n - self.size)
+        if evicted:
+            old = (self.head - self.count + np.arange(evicted)) % self.size
+            self.potable_sum -= int(self.potability[old].sum())
+            self.confidence_sum -= float(np.nansum(self.confidence[old]))
+            self.confidence_count -= int(np.count_nonzero(~np.isnan(self.confidence[old])))
+            self.flag_counts -= self.flags[old].sum(axis=0)
+
+        self.potability[slots] = potability
+        self.confidence[slots] = confidence
+        self.flags[slots] = flags
+        self.potable_sum += int(np.sum(potability))
+        self.confidence_sum += float(np.nansum(confidence))
+        self.confidence_count += int(np.count_nonzero(~np.isnan(confidence)))
+        self.flag_counts += np.sum(flags, axis=0)
+
+        self.head = (self.head + n) % self.size
+        self.count = min(self.size, self.count + n)
+
+    def aggregates(self):
+        """Return the window's potability rate, mean confidence and per-rule violation rates"""
+        if self.count == 0:
+            return {'readings': 0, 'potability_rate': None, 'avg_confidence': None, 'violation_rates': {}}
+        return {
+            'readings': self.count,
+            'potability_rate': self.potable_sum / self.count,
+            'avg_confidence': self.confidence_sum / self.confidence_count if self.confidence_count else None,
+            'violation_rates': dict(zip(RULE_PARAMETERS, (self.flag_counts / self.count).tolist())),
+        }
+
+    def update_alerts(self, persist_fraction, min_readings):
+        """Return (raised, cleared) rule parameters whose violations persist across the window"""
+        if self.count < min_readings:
+            return [], []
+        rates = self.flag_counts / self.count
+        persistent = {param for param, rate in zip(RULE_PARAMETERS, rates) if rate >= persist_fraction}
+        raised = sorted(persistent - self.active_alerts)
+        cleared = sorted(self.active_alerts - persistent)
+        self.active_alerts = persistent
+        return raised, cleared
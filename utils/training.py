@@ -0,0 +1,325 @@
+import copy
+import glob
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from utils.ml_model import FEATURE_COLUMNS, count_safe_conditions
+from utils.data_handler import read_prediction_store, store_write_lock
+
+MODEL_PATH = "models/model.pkl"
+REGISTRY_PATH = "models/registry.json"
+BASE_DATASET_PATH = "your_dataset.csv"
+# Versioned model files kept next to model.pkl; older ones are pruned on publish
+KEEP_MODEL_VERSIONS = 5
+
+def label_potability(samples_df):
+    """Label samples with the same rule train_model.py uses (at least 7 of 9 parameters safe)"""
+    return (count_safe_conditions(samples_df) >= 7).astype(int)
+
+def load_base_dataset(path=BASE_DATASET_PATH):
+    """Load the static training dataset with recalculated labels"""
+    df = pd.read_csv(path).dropna()
+    X = df[FEATURE_COLUMNS].astype(float)
+    return X, label_potability(X)
+
+def split_base_dataset(path=BASE_DATASET_PATH):
+    """Return the same train/test split train_model.py uses"""
+    X, y = load_base_dataset(path)
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+def _write_atomic(path, write):
+    """Write a file through a temporary sibling and rename it into place"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_registry(path=REGISTRY_PATH):
+    """Load model version metadata; a missing registry means version 0"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'version': 0, 'last_timestamp': None, 'last_ids': [], 'accuracy': None}
+
+def save_registry(registry, path=REGISTRY_PATH):
+    """Atomically save model version metadata"""
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(registry, f, indent=2)
+    _write_atomic(path, write)
+
+def _prune_model_versions(directory, version, keep=KEEP_MODEL_VERSIONS):
+    """Delete model_v<N>.pkl files older than the last keep versions"""
+    for versioned_path in glob.glob(os.path.join(directory, "model_v*.pkl")):
+        match = re.fullmatch(r"model_v(\d+)\.pkl", os.path.basename(versioned_path))
+        if match and int(match.group(1)) <= version - keep:
+            try:
+                os.remove(versioned_path)
+            except FileNotFoundError:
+                pass
+
+def publish_model(model, registry, path=MODEL_PATH, registry_path=REGISTRY_PATH):
+    """Atomically publish a new model version; readers see either the old or the new file.
+
+    Publishers are serialized across processes so concurrent runs get distinct
+    version numbers and never interleave the model and registry writes.
+    """
+    directory = os.path.dirname(path) or "."
+    with store_write_lock('model_registry'):
+        registry = dict(registry)
+        current_version = load_registry(registry_path).get('version', 0)
+        registry['version'] = max(registry.get('version', 0), current_version) + 1
+        registry['published_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        versioned_path = os.path.join(directory, f"model_v{registry['version']}.pkl")
+        _write_atomic(versioned_path, lambda tmp_path: joblib.dump(model, tmp_path))
+        _write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+        save_registry(registry, registry_path)
+        _prune_model_versions(directory, registry['version'])
+    return registry
+
+def get_new_predictions(registry, path=None):
+    """Return prediction rows added after the registry's high-water mark (from the configured store unless a CSV path is given)"""
+    try:
+        predictions_df = read_prediction_store() if path is None else pd.read_csv(path)
+    except FileNotFoundError:
+        return pd.DataFrame()
+    if predictions_df.empty:
+        return predictions_df
+
+    predictions_df = predictions_df.dropna(subset=FEATURE_COLUMNS + ['timestamp'])
+    last_timestamp = registry.get('last_timestamp')
+    if last_timestamp is None:
+        return predictions_df
+
+    timestamps = predictions_df['timestamp'].astype(str)
+    is_new = (timestamps > last_timestamp) | (
+        (timestamps == last_timestamp) & ~predictions_df['prediction_id'].isin(registry.get('last_ids', []))
+    )
+    return predictions_df[is_new]
+
+def advance_high_water_mark(registry, new_rows):
+    """Record the newest timestamp (and the ids at that timestamp) consumed by a model version"""
+    registry = dict(registry)
+    if new_rows.empty:
+        return registry
+    timestamps = new_rows['timestamp'].astype(str)
+    newest = timestamps.max()
+    newest_ids = new_rows.loc[timestamps == newest, 'prediction_id'].astype(str).tolist()
+    if newest == registry.get('last_timestamp'):
+        newest_ids = list(registry.get('last_ids', [])) + newest_ids
+    registry['last_timestamp'] = newest
+    registry['last_ids'] = newest_ids
+    return registry
+
+def warm_start_model(model, X_new, y_new, add_trees=10, max_trees=300):
+    """Return a copy of a forest with extra trees grown on new data, or a fresh forest trained on X_new otherwise.
+
+    A fresh forest is built once max_trees is reached or when the model is not
+    a forest (an SGD pipeline or a distilled tree), so callers should pass the
+    full training set in that case.
+    """
+    if isinstance(model, RandomForestClassifier) and model.n_estimators + add_trees <= max_trees:
+        updated = copy.deepcopy(model)
+        updated.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees, n_jobs=1)
+        updated.fit(X_new, y_new)
+        updated.set_params(warm_start=False)
+        return updated
+
+    fresh = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=1)
+    fresh.fit(X_new, y_new)
+    return fresh
+
+def retrain_from_predictions(min_new_rows=20, add_trees=10, max_trees=300, tolerance=0.01,
+                             model_path=MODEL_PATH, registry_path=REGISTRY_PATH,
+                             predictions_path=None):
+    """Run one incremental retraining round and return a status message"""
+    registry = load_registry(registry_path)
+    new_rows = get_new_predictions(registry, predictions_path)
+    if len(new_rows) < min_new_rows:
+        return f"Skipped: {len(new_rows)} new rows (need {min_new_rows})"
+
+    X_new = new_rows[FEATURE_COLUMNS].astype(float)
+    y_new = label_potability(X_new)
+
+    # Hold out part of the new rows alongside the base test split
+    X_base_train, X_base_test, y_base_train, y_base_test = split_base_dataset()
+    X_new_train, X_new_test, y_new_train, y_new_test = train_test_split(
+        X_new, y_new, test_size=0.2, random_state=registry.get('version', 0)
+    )
+    X_holdout = pd.concat([X_base_test, X_new_test], ignore_index=True)
+    y_holdout = pd.concat([y_base_test, y_new_test], ignore_index=True)
+
+    # Replay a sample of the base data so new trees see both classes and do not drift
+    replay = X_base_train.sample(n=min(len(X_base_train), max(len(X_new_train), 50)),
+                                 random_state=registry.get('version', 0))
+    X_train = pd.concat([X_new_train, replay], ignore_index=True)
+    y_train = pd.concat([y_new_train, y_base_train.loc[replay.index]], ignore_index=True)
+
+    current_model = joblib.load(model_path)
+    if not isinstance(current_model, RandomForestClassifier) or current_model.n_estimators + add_trees > max_trees:
+        # Start over from the base data and the full history: the forest is at its size
+        # limit, or the model cannot grow trees and a fresh forest replaces it
+        history = get_new_predictions({'last_timestamp': None}, predictions_path)
+        history = history[~history['prediction_id'].isin(new_rows.loc[X_new_test.index, 'prediction_id'])]
+        X_history = history[FEATURE_COLUMNS].astype(float)
+        X_train = pd.concat([X_base_train, X_history], ignore_index=True)
+        y_train = pd.concat([y_base_train, label_potability(X_history)], ignore_index=True)
+    candidate = warm_start_model(current_model, X_train, y_train, add_trees, max_trees)
+
+    current_accuracy = accuracy_score(y_holdout, current_model.predict(X_holdout))
+    candidate_accuracy = accuracy_score(y_holdout, candidate.predict(X_holdout))
+    if candidate_accuracy + tolerance < current_accuracy:
+        return (f"Rejected: candidate accuracy {candidate_accuracy:.3f} "
+                f"below current {current_accuracy:.3f}")
+
+    registry = advance_high_water_mark(registry, new_rows)
+    registry['accuracy'] = round(candidate_accuracy, 4)
+    registry['trained_rows'] = len(new_rows)
+    registry = publish_model(candidate, registry, model_path, registry_path)
+    return (f"Published model v{registry['version']} trained on {len(new_rows)} new rows "
+            f"(holdout accuracy {candidate_accuracy:.3f}, previous {current_accuracy:.3f})")
+
+def iter_labeled_chunks(path=BASE_DATASET_PATH, chunksize=100000, holdout_fraction=0.2, seed=42):
+    """Stream (X, y, is_holdout) chunks from a CSV, dropping incomplete rows per chunk.
+
+    The holdout mask is derived from the chunk index, so every pass over the
+    file holds out exactly the same rows.
+    """
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=lambda col: col in FEATURE_COLUMNS)
+    for chunk_index, chunk in enumerate(reader):
+        chunk = chunk.dropna(subset=FEATURE_COLUMNS)
+        if chunk.empty:
+            continue
+        X = chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        y = label_potability(chunk).to_numpy()
+        is_holdout = np.random.default_rng([seed, chunk_index]).random(len(chunk)) < holdout_fraction
+        yield X, y, is_holdout
+
+def evaluate_streaming(model, path=BASE_DATASET_PATH, chunksize=100000, holdout_fraction=0.2, seed=42):
+    """Accuracy of a model on the streamed holdout rows"""
+    correct = total = 0
+    for X, y, is_holdout in iter_labeled_chunks(path, chunksize, holdout_fraction, seed):
+        if not is_holdout.any():
+            continue
+        X_holdout = pd.DataFrame(X[is_holdout], columns=FEATURE_COLUMNS)
+        correct += int((model.predict(X_holdout) == y[is_holdout]).sum())
+        total += int(is_holdout.sum())
+    return correct / total if total else float('nan')
+
+def train_streaming_sgd(path=BASE_DATASET_PATH, chunksize=100000, epochs=5, holdout_fraction=0.2, seed=42):
+    """Train an incremental logistic-regression pipeline with partial_fit, one chunk in memory at a time"""
+    scaler = StandardScaler()
+    for X, y, is_holdout in iter_labeled_chunks(path, chunksize, holdout_fraction, seed):
+        if (~is_holdout).any():
+            scaler.partial_fit(pd.DataFrame(X[~is_holdout], columns=FEATURE_COLUMNS))
+
+    classifier = SGDClassifier(loss='log_loss', random_state=seed)
+    for _ in range(epochs):
+        for X, y, is_holdout in iter_labeled_chunks(path, chunksize, holdout_fraction, seed):
+            if (~is_holdout).any():
+                X_train = scaler.transform(pd.DataFrame(X[~is_holdout], columns=FEATURE_COLUMNS))
+                classifier.partial_fit(X_train, y[~is_holdout], classes=np.array([0, 1]))
+
+    return Pipeline([('scaler', scaler), ('classifier', classifier)])
+
+def _reservoir_update(reservoir_X, reservoir_y, filled, seen, X, y, rng):
+    """Vectorized Algorithm R: fold a chunk into a fixed-size uniform sample of the stream"""
+    capacity = len(reservoir_X)
+    take = min(capacity - filled, len(X))
+    if take > 0:
+        reservoir_X[filled:filled + take] = X[:take]
+        reservoir_y[filled:filled + take] = y[:take]
+        filled += take
+    rest_X, rest_y = X[take:], y[take:]
+    if len(rest_X):
+        # Row i of the remainder is stream item number seen + take + i + 1
+        positions = seen + take + np.arange(1, len(rest_X) + 1)
+        slots = (rng.random(len(rest_X)) * positions).astype(np.int64)
+        keep = slots < capacity
+        # Later rows overwrite earlier ones on duplicate slots, matching the sequential algorithm
+        reservoir_X[slots[keep]] = rest_X[keep]
+        reservoir_y[slots[keep]] = rest_y[keep]
+    return filled, seen + len(X)
+
+def assemble_forest(trees, random_state=42):
+    """Wrap independently trained decision trees in a RandomForestClassifier so serving code can use them"""
+    forest = RandomForestClassifier(n_estimators=len(trees), random_state=random_state)
+    forest.estimator_ = DecisionTreeClassifier()
+    forest.estimators_ = trees
+    forest.classes_ = np.array([0, 1])
+    forest.n_classes_ = 2
+    forest.n_outputs_ = 1
+    forest.n_features_in_ = len(FEATURE_COLUMNS)
+    forest.feature_names_in_ = np.array(FEATURE_COLUMNS, dtype=object)
+    return forest
+
+def train_streaming_forest(path=BASE_DATASET_PATH, chunksize=100000, n_estimators=100,
+                           rows_per_tree=50000, max_rows_in_memory=1000000,
+                           holdout_fraction=0.2, seed=42):
+    """Train a bagged forest where each tree sees a uniform streamed sample of the data.
+
+    Peak memory is bounded by chunksize + max_rows_in_memory rows regardless of
+    dataset size: each pass over the file fills one reservoir per tree for as
+    many trees as fit in max_rows_in_memory, then grows those trees. When the
+    data is no larger than rows_per_tree each tree gets a bootstrap sample of it.
+    """
+    trees_per_pass = max(1, max_rows_in_memory // rows_per_tree)
+    rng = np.random.default_rng(seed)
+    trees = []
+
+    while len(trees) < n_estimators:
+        pass_trees = min(trees_per_pass, n_estimators - len(trees))
+        reservoirs_X = np.empty((pass_trees, rows_per_tree, len(FEATURE_COLUMNS)))
+        reservoirs_y = np.empty((pass_trees, rows_per_tree), dtype=np.int64)
+        filled = [0] * pass_trees
+        seen = [0] * pass_trees
+
+        for X, y, is_holdout in iter_labeled_chunks(path, chunksize, holdout_fraction, seed):
+            X_train, y_train = X[~is_holdout], y[~is_holdout]
+            for t in range(pass_trees):
+                filled[t], seen[t] = _reservoir_update(
+                    reservoirs_X[t], reservoirs_y[t], filled[t], seen[t], X_train, y_train, rng
+                )
+
+        added = 0
+        for t in range(pass_trees):
+            sample_X, sample_y = reservoirs_X[t][:filled[t]], reservoirs_y[t][:filled[t]]
+            if 0 < seen[t] <= rows_per_tree:
+                # The reservoir holds every training row, so bootstrap it to keep the trees diverse
+                rows = rng.integers(0, filled[t], size=filled[t])
+                sample_X, sample_y = sample_X[rows], sample_y[rows]
+            if len(np.unique(sample_y)) < 2:
+                print("⚠️ Skipping a tree whose streamed sample contains a single class")
+                continue
+            tree = DecisionTreeClassifier(max_features='sqrt', random_state=int(rng.integers(2**31 - 1)))
+            tree.fit(sample_X, sample_y)
+            trees.append(tree)
+            added += 1
+        if added == 0:
+            raise ValueError("Streamed samples never contained both potability classes")
+        del reservoirs_X, reservoirs_y
+
+    return assemble_forest(trees, seed)
@@ -255,3 +255,121 @@ def create_user_history_chart(user_predictions):
     )
     
     return fig
+
+def extend_user_history_chart(fig, new_predictions):
+    """Append newer predictions to a chart built by create_user_history_chart"""
+    if new_predictions.empty:
+        return fig
+    trace = fig.data[0]
+    trace.x = tuple(trace.x) + tuple(pd.to_datetime(new_predictions['timestamp']))
+    trace.y = tuple(trace.y) + tuple(new_predictions['confidence'])
+    trace.marker.color = tuple(trace.marker.color) + tuple(
+        '#ff6b6b' if p == 0 else '#51cf66' for p in new_predictions['potability']
+    )
+    trace.text = tuple(trace.text) + tuple(
+        f"{'Drinkable' if p == 1 else 'Not Drinkable'}<br>Confidence: {c:.1f}%<br>Region: {r}"
+        for p, c, r in zip(new_predictions['potability'], new_predictions['confidence'], new_predictions['region'])
+    )
+    return fig
+
+def create_contribution_chart(contributions, bias=None):
+    """Create chart showing how much each parameter pushed one prediction towards drinkable or not"""
+    if contributions is None or len(contributions) == 0:
+        return go.Figure()
+    
+    contributions = pd.Series(contributions).sort_values()
+    colors = ['#51cf66' if value >= 0 else '#ff6b6b' for value in contributions.values]
+    
+    fig = go.Figure(data=[
+        go.Bar(
+            x=contributions.values * 100,
+            y=contributions.index,
+            orientation='h',
+            marker_color=colors,
+            text=[f"{value * 100:+.1f}%" for value in contributions.values],
+            textposition='auto'
+        )
+    ])
+    
+    title = "Parameter Influence on This Prediction"
+    if bias is not None:
+        title += f" (baseline {bias * 100:.1f}% drinkable)"
+    fig.update_layout(
+        title=title,
+        xaxis_title="Change in Drinkable Probability (%)",
+        yaxis_title="Parameter",
+        height=400
+    )
+    
+    return fig
+
+def create_influence_chart(mean_abs_contributions):
+    """Create chart showing the average influence of each parameter across predictions"""
+    if not mean_abs_contributions:
+        return go.Figure()
+    
+    influence = pd.Series(mean_abs_contributions).sort_values(ascending=False)
+    
+    fig = go.Figure(data=[
+        go.Bar(
+            x=influence.index,
+            y=influence.values * 100,
+            marker_color='#845ef7',
+            text=[f"{value * 100:.1f}%" for value in influence.values],
+            textposition='auto'
+        )
+    ])
+    
+    fig.update_layout(
+        title="Average Parameter Influence on Predictions",
+        xaxis_title="Parameters",
+        yaxis_title="Mean Absolute Change in Drinkable Probability (%)",
+        height=400
+    )
+    
+    return fig
+
+def create_what_if_chart(sample_data, x_param, x_values, probabilities, y_param=None, y_values=None):
+    """Create a chart of drinkable probability as one parameter (line) or two parameters (heatmap) change"""
+    if y_param is None:
+        fig = go.Figure(data=[
+            go.Scatter(x=x_values, y=probabilities, mode='lines', line=dict(color='#339af0'), name='Drinkable probability')
+        ])
+        fig.add_hline(y=50, line_dash="dash", line_color="gray", annotation_text="Decision boundary")
+        fig.add_vline(x=sample_data[x_param], line_dash="dot", line_color="black", annotation_text="Your sample")
+        fig.update_layout(
+            title=f"Drinkable Probability as {x_param} Changes",
+            xaxis_title=x_param,
+            yaxis_title="Drinkable Probability (%)",
+            yaxis_range=[0, 100],
+            height=400
+        )
+        return fig
+    
+    fig = go.Figure(data=[
+        go.Heatmap(
+            x=x_values, y=y_values, z=probabilities,
+            colorscale=[[0, '#ff6b6b'], [0.5, '#fff3bf'], [1, '#51cf66']],
+            zmin=0, zmax=100,
+            colorbar=dict(title="Drinkable %"),
+            hovertemplate=f"{x_param}: %{{x:.2f}}<br>{y_param}: %{{y:.2f}}<br>Drinkable: %{{z:.0f}}%<extra></extra>"
+        ),
+        go.Contour(
+            x=x_values, y=y_values, z=probabilities,
+            contours=dict(start=50, end=50, size=1, coloring='none'),
+            line=dict(color='black', width=2),
+            showscale=False, hoverinfo='skip', name='Decision boundary'
+        ),
+        go.Scatter(
+            x=[sample_data[x_param]], y=[sample_data[y_param]], mode='markers',
+            marker=dict(symbol='x', size=14, color='black'), name='Your sample'
+        )
+    ])
+    fig.update_layout(
+        title=f"Decision Boundary over {x_param} and {y_param}",
+        xaxis_title=x_param,
+        yaxis_title=y_param,
+        height=500,
+        showlegend=False
+    )
+    return fig
@@ -0,0 +1,100 @@
+"""Check the rule fast path of the cascaded scorer against the model.
+
+Scores the dataset with the model alone and with the cascade, then reports
+how often each path fires, how well the two agree (overall and on the
+samples the rule decided), their accuracy against the labelling rule, the
+model's drinkable rate for every safe-condition count, and the time each
+approach takes. Exits with status 1 when agreement on the rule-decided
+samples is below --min-agreement.
+
+Usage:
+    python verify_cascade.py
+    python verify_cascade.py --safe-min 8 --unsafe-max 4 --repeat 50
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from utils.ml_model import (
+    FEATURE_COLUMNS,
+    RULE_SAFE_MIN,
+    RULE_UNSAFE_MAX,
+    get_cached_model,
+    score_model,
+    score_batch,
+    count_safe_conditions,
+)
+
+
+def timed(func, repeat):
+    """Best wall time of repeat calls, and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the rule fast path against the model")
+    parser.add_argument("--dataset", default="your_dataset.csv")
+    parser.add_argument("--model", default="models/model.pkl")
+    parser.add_argument("--safe-min", type=int, default=RULE_SAFE_MIN, help="Safe parameters needed to skip the model as drinkable")
+    parser.add_argument("--unsafe-max", type=int, default=RULE_UNSAFE_MAX, help="Safe parameters at or below which a sample skips the model as not drinkable")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions")
+    parser.add_argument("--min-agreement", type=float, default=1.0, help="Required agreement on rule-decided samples")
+    args = parser.parse_args()
+
+    X = pd.read_csv(args.dataset).dropna(subset=FEATURE_COLUMNS)[FEATURE_COLUMNS].astype(float)
+    model = get_cached_model(args.model)
+    safe_counts = count_safe_conditions(X).to_numpy()
+    labels = (safe_counts >= 7).astype(int)
+
+    model_time, (model_predictions, _) = timed(lambda: score_model(model, X), args.repeat)
+    cascade_time, (cascade_predictions, _) = timed(
+        lambda: score_batch(model, X, cascade=True, safe_min=args.safe_min, unsafe_max=args.unsafe_max), args.repeat)
+
+    rule_drinkable = safe_counts >= args.safe_min
+    rule_not_drinkable = safe_counts <= args.unsafe_max
+    decided = rule_drinkable | rule_not_drinkable
+    total = len(X)
+
+    print(f"Samples: {total} from {args.dataset}")
+    print(f"Rule path, drinkable (>= {args.safe_min} safe):     {rule_drinkable.sum():>6} ({rule_drinkable.mean():.1%})")
+    print(f"Rule path, not drinkable (<= {args.unsafe_max} safe): {rule_not_drinkable.sum():>6} ({rule_not_drinkable.mean():.1%})")
+    print(f"Model path (borderline):             {(~decided).sum():>6} ({(~decided).mean():.1%})")
+    print()
+
+    agreement = (cascade_predictions == model_predictions).mean()
+    rule_agreement = (cascade_predictions[decided] == model_predictions[decided]).mean() if decided.any() else 1.0
+    print(f"Agreement with the model, all samples:  {agreement:.2%}")
+    print(f"Agreement with the model, rule-decided: {rule_agreement:.2%}")
+    print(f"Accuracy against the labelling rule: model {(model_predictions == labels).mean():.2%}, "
+          f"cascade {(cascade_predictions == labels).mean():.2%}")
+    print()
+
+    print(f"{'Safe count':>10}{'Samples':>9}{'Model drinkable':>17}{'Path':>8}")
+    for count in range(len(FEATURE_COLUMNS) + 1):
+        rows = safe_counts == count
+        if not rows.any():
+            continue
+        path = 'rule' if count >= args.safe_min or count <= args.unsafe_max else 'model'
+        print(f"{count:>10}{rows.sum():>9}{model_predictions[rows].mean():>17.1%}{path:>8}")
+    print()
+
+    print(f"Model only: {model_time * 1000:.1f} ms ({total / model_time:,.0f} samples/s)")
+    print(f"Cascade:    {cascade_time * 1000:.1f} ms ({total / cascade_time:,.0f} samples/s, "
+          f"{model_time / cascade_time:.1f}x)")
+
+    if rule_agreement < args.min_agreement:
+        print(f"❌ Rule-decided samples agree with the model on {rule_agreement:.2%}, below {args.min_agreement:.2%}")
+        sys.exit(1)
+    print("✅ Rule fast path agrees with the model")
+
+
+if __name__ == "__main__":
+    main()